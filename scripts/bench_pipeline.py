@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+"""Benchmark the stages of the generation of partial data.
+
+Generate deterministic synthetic textured meshes (tori with a UV atlas) of
+several sizes, then time each stage on its own (loading and saving, KD-tree,
+holes, removal of the points, texture rendering) and the command line
+end to end (`convert`, `shoot`, `shoot_dir`), with their peak memory.
+
+Everything runs on CPU. The OpenGL rendering stage is skipped when no context
+can be created.
+
+The results are written as JSON lines: a first record describing the
+environment, then a record per (stage, mesh size, texture size). Pass the
+results of a previous run with `--baseline` to print the relative changes.
+
+usage: python scripts/bench_pipeline.py [--vertices 10000 100000]
+           [--texture-sizes 1024 2048] [--repeat 3] [--output results.jsonl]
+           [--baseline previous.jsonl]
+"""
+import argparse
+import json
+import os
+import pathlib
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+# Root of the checkout, to run without installing the package.
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from sharp import data  # noqa: E402
+from sharp import utils  # noqa: E402
+
+
+def make_torus(n_vertices, texture_size, seed=0):
+    """Textured torus with about `n_vertices` vertices and a UV atlas.
+
+    The torus is a periodic (n x 2n) grid of vertices. The texture
+    coordinates are a (n + 1 x 2n + 1) grid, with the seams duplicated, and
+    the texture a smooth pattern with deterministic noise.
+    """
+    n = max(int(np.sqrt(n_vertices / 2)), 3)
+    m = 2 * n
+    rng = np.random.default_rng(seed)
+
+    # Vertices.
+    theta, phi = np.meshgrid(2 * np.pi * np.arange(m) / m,
+                             2 * np.pi * np.arange(n) / n)
+    radius = 1 + .4 * np.cos(phi)
+    vertices = np.stack([radius * np.cos(theta),
+                         radius * np.sin(theta),
+                         .4 * np.sin(phi)], axis=-1).reshape(-1, 3)
+    grid = np.arange(n * m).reshape(n, m)
+    grid = np.concatenate([grid, grid[:1]], axis=0)
+    grid = np.concatenate([grid, grid[:, :1]], axis=1)
+
+    # Texture coordinates, with the seams duplicated.
+    u, v = np.meshgrid(np.linspace(0, 1, m + 1), np.linspace(0, 1, n + 1))
+    texcoords = np.stack([u, v], axis=-1).reshape(-1, 2)
+    tex_grid = np.arange((n + 1) * (m + 1)).reshape(n + 1, m + 1)
+
+    def quads_to_triangles(grid):
+        a = grid[:-1, :-1].ravel()
+        b = grid[:-1, 1:].ravel()
+        c = grid[1:, :-1].ravel()
+        d = grid[1:, 1:].ravel()
+        return np.concatenate([np.stack([a, b, c], axis=1),
+                               np.stack([b, d, c], axis=1)])
+
+    faces = quads_to_triangles(grid)
+    texture_indices = quads_to_triangles(tex_grid)
+
+    x, y = np.meshgrid(np.linspace(0, 8 * np.pi, texture_size),
+                       np.linspace(0, 8 * np.pi, texture_size))
+    pattern = np.stack([np.sin(x), np.cos(y), np.sin(x + y)], axis=-1)
+    pattern = .5 + .4 * pattern
+    pattern += rng.normal(scale=.05, size=pattern.shape)
+    texture = (255 * np.clip(pattern, 0, 1)).astype(np.uint8)
+
+    return data.Mesh(vertices=vertices, faces=faces, texcoords=texcoords,
+                     texture_indices=texture_indices, texture=texture)
+
+
+def measure(function, repeat, memory=True):
+    """Time a function and measure its peak memory.
+
+    The peak memory is the peak of the memory allocated through Python
+    (including numpy arrays) during an extra untimed call, traced with
+    `tracemalloc`.
+
+    Returns:
+        A dict with the times of the calls and the peak memory in bytes.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    result = {"times": times, "best": min(times),
+              "median": float(np.median(times))}
+    if memory:
+        tracemalloc.start()
+        try:
+            function()
+            _, result["peak_bytes"] = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def run_command(arguments):
+    """Run a command of `python -m sharp` and measure it.
+
+    Returns:
+        A dict with the time and the peak resident memory of the largest
+        process (i.e. the main process or one of its workers), in bytes.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "sharp", *arguments],
+                               cwd=REPO_ROOT,
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE)
+    # Read stderr before waiting, to not block the process on a full pipe.
+    with process.stderr:
+        stderr = process.stderr.read()
+    _, status, rusage = os.wait4(process.pid, 0)
+    # Mark the process as waited for.
+    process.returncode = os.waitstatus_to_exitcode(status)
+    elapsed = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(stderr.decode(errors="replace")[-2000:])
+    # ru_maxrss is in kilobytes on Linux.
+    return {"times": [elapsed], "best": elapsed, "median": elapsed,
+            "peak_rss_bytes": rusage.ru_maxrss * 1024}
+
+
+def stage_benchmarks(mesh, work_dir, args):
+    """Benchmarks of the stages on their own.
+
+    Yields:
+        (name, function to time).
+    """
+    npz_path = work_dir / "mesh.npz"
+    obj_path = work_dir / "mesh.obj"
+    out_npz_path = work_dir / "out.npz"
+    out_obj_path = work_dir / "out.obj"
+    data.save_npz(npz_path, mesh)
+    data.save_obj(obj_path, mesh)
+
+    def load_npz():
+        loaded = data.load_npz(npz_path)
+        # Decode the lazy attributes.
+        loaded.texture
+        loaded.texcoords
+        loaded.texture_indices
+
+    yield "load_npz", load_npz
+    yield "save_npz", lambda: data.save_npz(out_npz_path, mesh)
+    yield "load_obj", lambda: data.load_obj(obj_path)
+    yield "save_obj", lambda: data.save_obj(out_obj_path, mesh)
+
+    yield "build_kdtree", lambda: utils.build_kdtree(mesh.vertices)
+
+    kdtree = utils.build_kdtree(mesh.vertices)
+
+    def shoot_holes():
+        return utils.shoot_holes(mesh.vertices, args.holes, args.dropout,
+                                 rng=np.random.default_rng(0), kdtree=kdtree)
+
+    yield "shoot_holes", shoot_holes
+
+    indices = shoot_holes()
+    yield "remove_points", lambda: utils.remove_points(
+        mesh, indices, blackoutTexture=False)
+    partial = utils.remove_points(mesh, indices, blackoutTexture=False)
+
+    for backend in utils.RENDER_BACKENDS:
+        yield f"render_texture_{backend}", lambda backend=backend: (
+            utils.render_texture(mesh.texture, partial.texcoords,
+                                 partial.texture_indices, backend=backend))
+
+    yield "remove_points_incremental", lambda: utils.remove_points(
+        mesh, indices, incremental_blackout=True)
+
+
+def command_benchmarks(mesh, work_dir, args):
+    """Benchmarks of the command line end to end.
+
+    Yields:
+        (name, arguments of `python -m sharp` or function returning them for
+        each run).
+    """
+    npz_path = work_dir / "mesh.npz"
+    data.save_npz(npz_path, mesh)
+    yield "cli_convert", ["convert", str(npz_path),
+                          str(work_dir / "converted.obj")]
+    yield "cli_shoot", ["shoot", str(npz_path), str(work_dir / "shot.npz"),
+                        "--holes", str(args.holes),
+                        "--dropout", str(args.dropout),
+                        "--seed", "0",
+                        "--render-backend", "cpu"]
+
+    input_dir = work_dir / "shoot_dir_input"
+    for index in range(args.n_meshes):
+        path = input_dir / f"{index}" / f"{index}_normalized.npz"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.link(npz_path, path)
+    output_index = 0
+
+    def shoot_dir_arguments():
+        # A new output directory per run, so that no shape is skipped.
+        nonlocal output_index
+        output_index += 1
+        return ["shoot_dir", str(input_dir),
+                str(work_dir / f"shoot_dir_output_{output_index}"),
+                "--holes", str(args.holes),
+                "--dropout", str(args.dropout),
+                "--seed", "0",
+                "--n-shapes", str(args.n_shapes),
+                "--n-workers", str(args.n_workers),
+                "--render-backend", "cpu"]
+
+    yield "cli_shoot_dir", shoot_dir_arguments
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"],
+                                capture_output=True, text=True,
+                                cwd=REPO_ROOT,
+                                ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "n_cpus": os.cpu_count(),
+    }
+
+
+def run(args):
+    yield {"environment": environment(), "arguments": vars(args)}
+    for n_vertices in args.vertices:
+        for texture_size in args.texture_sizes:
+            mesh = make_torus(n_vertices, texture_size)
+            key = {"vertices": len(mesh.vertices),
+                   "faces": len(mesh.faces),
+                   "texture_size": texture_size}
+            with tempfile.TemporaryDirectory() as work_dir:
+                work_dir = pathlib.Path(work_dir)
+                for name, function in stage_benchmarks(mesh, work_dir, args):
+                    record = {"benchmark": name, **key}
+                    try:
+                        record.update(measure(function, args.repeat,
+                                              memory=not args.no_memory))
+                    except Exception as e:
+                        # E.g. no OpenGL context.
+                        record["skipped"] = repr(e)
+                    yield record
+
+                for name, arguments in command_benchmarks(mesh, work_dir,
+                                                          args):
+                    record = {"benchmark": name, **key}
+                    runs = [run_command(arguments()
+                                        if callable(arguments)
+                                        else arguments)
+                            for _ in range(args.repeat)]
+                    times = [result["best"] for result in runs]
+                    record.update(
+                        times=times,
+                        best=min(times),
+                        median=float(np.median(times)),
+                        peak_rss_bytes=max(result["peak_rss_bytes"]
+                                           for result in runs))
+                    yield record
+
+
+def _key(record):
+    return (record["benchmark"], record["vertices"], record["texture_size"])
+
+
+def compare(records, baseline_path, file=sys.stderr):
+    """Print the relative change of the best times against a baseline."""
+    with open(baseline_path) as f:
+        baseline = {_key(record): record
+                    for record in map(json.loads, f)
+                    if "benchmark" in record and "best" in record}
+    for record in records:
+        previous = baseline.get(_key(record))
+        if previous is None or "best" not in record:
+            continue
+        change = record["best"] / previous["best"] - 1
+        print(f"{record['benchmark']:>26} {record['vertices']:>9}"
+              f" {record['texture_size']:>5}:"
+              f" {previous['best']:8.3f}s -> {record['best']:8.3f}s"
+              f" ({change:+.1%})", file=file)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vertices", type=int, nargs="+",
+                        default=[10000, 100000],
+                        help="Approximate numbers of vertices of the meshes"
+                             " (e.g. up to 10000000).")
+    parser.add_argument("--texture-sizes", type=int, nargs="+",
+                        default=[1024, 2048],
+                        help="Sizes of the square textures (e.g. up to"
+                             " 8192).")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--holes", type=int, default=40)
+    parser.add_argument("--dropout", type=float, default=.02)
+    parser.add_argument("--n-meshes", type=int, default=2,
+                        help="Number of meshes of the shoot_dir benchmark.")
+    parser.add_argument("--n-shapes", type=int, default=2,
+                        help="Number of shapes per mesh of the shoot_dir"
+                             " benchmark.")
+    parser.add_argument("--n-workers", type=int, default=2,
+                        help="Number of processes of the shoot_dir"
+                             " benchmark.")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="Do not measure the peak memory of the stages"
+                             " (it takes an extra traced call).")
+    parser.add_argument("--output", type=pathlib.Path, default=None,
+                        help="File where to write the results (JSON lines)."
+                             " Default is the standard output.")
+    parser.add_argument("--baseline", type=pathlib.Path, default=None,
+                        help="Results of a previous run to compare with.")
+    args = parser.parse_args()
+
+    output = sys.stdout if args.output is None else open(args.output, "w")
+    records = []
+    try:
+        for record in run(args):
+            output.write(json.dumps(record, default=str) + "\n")
+            output.flush()
+            records.append(record)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    if args.baseline is not None:
+        compare(records, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""Benchmark the texture rendering backends (OpenGL and software).
+
+Render the texture of a synthetic textured mesh with each backend of
+`sharp.utils.render_texture` at several atlas sizes. The OpenGL backend is
+skipped when no context can be created.
+
+usage: python scripts/bench_rasterizer.py [--sizes 2048 4096] [--repeat 3]
+"""
+import argparse
+import pathlib
+import sys
+import time
+
+import numpy as np
+
+# Run from a checkout without installing the package.
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from sharp import data  # noqa: E402
+from sharp import utils  # noqa: E402
+
+
+def make_mesh(n, texture_size, seed=0):
+    """Textured sphere with a (n x n) grid of vertices and a random atlas."""
+    rng = np.random.default_rng(seed)
+    u, v = np.meshgrid(np.linspace(0, 1, n), np.linspace(0, 1, n))
+    theta = 2 * np.pi * u
+    phi = np.pi * v
+    vertices = np.stack([np.sin(phi) * np.cos(theta),
+                         np.sin(phi) * np.sin(theta),
+                         np.cos(phi)], axis=-1).reshape(-1, 3)
+    grid = np.arange(n * n).reshape(n, n)
+    a = grid[:-1, :-1].ravel()
+    b = grid[:-1, 1:].ravel()
+    c = grid[1:, :-1].ravel()
+    d = grid[1:, 1:].ravel()
+    faces = np.concatenate([np.stack([a, b, c], axis=1),
+                            np.stack([b, d, c], axis=1)])
+    texcoords = np.stack([u, v], axis=-1).reshape(-1, 2)
+    texture = rng.integers(0, 256, size=(texture_size, texture_size, 3),
+                           dtype=np.uint8)
+    return data.Mesh(vertices=vertices, faces=faces, texcoords=texcoords,
+                     texture_indices=faces, texture=texture)
+
+
+def bench(mesh, backend, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        utils.render_texture(mesh.texture, mesh.texcoords,
+                             mesh.texture_indices, backend=backend)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2048, 4096])
+    parser.add_argument("--grid", type=int, default=300,
+                        help="Number of vertices along each side of the grid.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        mesh = make_mesh(args.grid, size)
+        for backend in utils.RENDER_BACKENDS:
+            try:
+                times = bench(mesh, backend, args.repeat)
+            except Exception as e:
+                print(f"{size} {backend}: skipped ({e})")
+                continue
+            # The first call of the gl backend includes the creation of the
+            # context and the upload of the texture.
+            print(f"{size} {backend}:"
+                  f" first {times[0]:.3f}s"
+                  f" best {min(times):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+"""Check that meshes round-trip through `save_obj` and `load_obj`.
+
+Save small meshes with each face corner form (`v`, `v/t`, `v//n`, `v/t/n`),
+with vertex colors and with a reduced precision, load them back and compare
+the arrays. The meshes are larger than the chunks of `save_obj`, so that
+several chunks are written. Also check that vertex records of mixed widths
+are rejected, and that the optional values of texture coordinates are
+dropped. Exits with a non-zero status on failure.
+
+usage: python scripts/check_obj_roundtrip.py
+"""
+import pathlib
+import sys
+import tempfile
+
+import numpy as np
+
+# Run from a checkout without installing the package.
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from sharp import data  # noqa: E402
+
+
+def make_mesh(n, seed=0):
+    """Random mesh of a (n x n) grid of vertices."""
+    rng = np.random.default_rng(seed)
+    grid = np.arange(n * n).reshape(n, n)
+    a = grid[:-1, :-1].ravel()
+    b = grid[:-1, 1:].ravel()
+    c = grid[1:, :-1].ravel()
+    d = grid[1:, 1:].ravel()
+    faces = np.concatenate([np.stack([a, b, c], axis=1),
+                            np.stack([b, d, c], axis=1)])
+    return data.Mesh(
+        vertices=rng.normal(size=(n * n, 3)),
+        faces=faces,
+    )
+
+
+def cases(n):
+    """(name, mesh, save_obj keyword arguments) to check."""
+    rng = np.random.default_rng(1)
+
+    mesh = make_mesh(n)
+    yield "v", mesh, {}
+
+    mesh = make_mesh(n)
+    mesh.texcoords = rng.random((n * n, 2))
+    mesh.texture_indices = mesh.faces[::-1].copy()
+    yield "v/t", mesh, {}
+
+    mesh = make_mesh(n)
+    mesh.normals = rng.normal(size=(n * n, 3))
+    mesh.faces_normal_indices = mesh.faces[:, ::-1].copy()
+    yield "v//n", mesh, {}
+
+    mesh = make_mesh(n)
+    mesh.texcoords = rng.random((n * n, 2))
+    mesh.texture_indices = mesh.faces[::-1].copy()
+    mesh.normals = rng.normal(size=(n * n, 3))
+    mesh.faces_normal_indices = mesh.faces[:, ::-1].copy()
+    yield "v/t/n", mesh, {}
+
+    mesh = make_mesh(n)
+    mesh.vertex_colors = rng.random((n * n, 3))
+    yield "vertex colors", mesh, {}
+
+    mesh = make_mesh(n)
+    mesh.texcoords = rng.random((n * n, 2))
+    mesh.texture_indices = mesh.faces.copy()
+    yield "precision", mesh, {"precision": 4}
+
+
+def rounded(values, precision):
+    """Float values as written with `precision` significant digits."""
+    if (values is None or precision is None
+            or not np.issubdtype(values.dtype, np.floating)):
+        return values
+    return np.array([float(f"{x:.{precision}g}") for x in values.ravel()]
+                    ).reshape(values.shape)
+
+
+def check(name, mesh, kwargs, directory):
+    path = pathlib.Path(directory) / "mesh.obj"
+    data.save_obj(path, mesh, **kwargs)
+
+    text = path.read_bytes()
+    errors = []
+    if not text.endswith(b"\n"):
+        errors.append("no final newline")
+    n_faces = sum(line.startswith(b"f ") for line in text.splitlines())
+    if n_faces != len(mesh.faces):
+        errors.append(f"{n_faces} face records for {len(mesh.faces)} faces")
+
+    loaded = data.load_obj(path)
+    precision = kwargs.get("precision")
+    for attribute in ("vertices", "vertex_colors", "faces", "texcoords",
+                      "texture_indices", "normals", "faces_normal_indices"):
+        expected = rounded(getattr(mesh, attribute), precision)
+        actual = getattr(loaded, attribute)
+        if expected is None and actual is None:
+            continue
+        if (expected is None or actual is None
+                or not np.array_equal(expected, actual)):
+            errors.append(f"{attribute} differs")
+
+    status = "ok" if not errors else "FAILED: " + ", ".join(errors)
+    print(f"{name}: {status}")
+    return not errors
+
+
+def check_mixed_widths(directory):
+    """Check the loading of records with different numbers of values."""
+    path = pathlib.Path(directory) / "mixed.obj"
+    errors = []
+
+    # 6 + 3 + 3 values: a multiple of the number of lines.
+    path.write_text("v 0 0 0 1 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\n")
+    try:
+        data.load_obj(path)
+        errors.append("vertices of mixed widths loaded")
+    except ValueError:
+        pass
+
+    # `vt u v` and `vt u v w`: the optional `w` is dropped.
+    path.write_text("v 0 0 0\nv 1 0 0\nv 0 1 0\n"
+                    "vt 0 0\nvt 1 0 0\nvt 0 1\nf 1/1 2/2 3/3\n")
+    loaded = data.load_obj(path)
+    if not np.array_equal(loaded.texcoords, [[0, 0], [1, 0], [0, 1]]):
+        errors.append("texcoords of mixed widths differ")
+
+    status = "ok" if not errors else "FAILED: " + ", ".join(errors)
+    print(f"mixed widths: {status}")
+    return not errors
+
+
+def main():
+    # Larger than the chunks of `save_obj`.
+    n = int(np.sqrt(data._OBJ_WRITE_CHUNK_SIZE)) + 10
+    with tempfile.TemporaryDirectory() as directory:
+        results = [check(name, mesh, kwargs, directory)
+                   for name, mesh, kwargs in cases(n)]
+        results.append(check_mixed_widths(directory))
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,155 +1,879 @@
 import argparse
 import concurrent.futures
+import contextlib
+import csv
+import fnmatch
 import itertools
+import json
 import logging
+import multiprocessing
+import os
 import pathlib
+import queue
 import sys
+import threading
+import time
 
 import numpy as np
 
 from . import data
+from . import evaluation
+from . import profiling
+from . import topology
 from . import utils
 
 
 logger = logging.getLogger(__name__)
 
 
+def write_spans(f, records):
+    """Write profiling records to a JSON Lines file."""
+    for record in records:
+        f.write(json.dumps(record) + "\n")
+    f.flush()
+
+
+@contextlib.contextmanager
+def profile_to(path, **labels):
+    """Profile a block of code, see `profiling`.
+
+    The spans recorded in the block, followed by their summary, are written to
+    the JSON Lines file `path`. Nothing is recorded if `path` is None.
+
+    Args:
+        path: Path to the output file, or None.
+        labels: Labels of the spans.
+    """
+    if path is None:
+        yield
+        return
+    profiling.enable()
+    try:
+        with profiling.labels(**labels):
+            yield
+    finally:
+        records = profiling.collect()
+        with open(path, "w") as f:
+            write_spans(f, records)
+            write_spans(f, profiling.summarize(records))
+
+
 def _do_convert(args):
+    with profile_to(args.profile, mesh=str(args.input)):
+        _convert(args)
+
+
+def _convert(args):
+    kwargs = {}
+    if args.precision is not None:
+        if args.output.suffix != ".obj":
+            raise ValueError("--precision is only supported for .obj outputs")
+        kwargs["precision"] = args.precision
+
+    if args.input.suffix == ".npz" and args.output.suffix == ".npmap":
+        # Copy the stored arrays directly, without conversion.
+        with profiling.span("convert_npz_to_npmap"):
+            data.convert_npz_to_npmap(args.input, args.output)
+        return
+
     mesh = data.load_mesh(args.input)
-    data.save_mesh(args.output, mesh)
+    data.save_mesh(args.output, mesh, **kwargs)
 
 
 def _do_shoot(args):
-    mesh = data.load_mesh(str(args.input))
+    with profile_to(args.profile, mesh=str(args.input)):
+        _shoot(args)
+
+
+def _value_or_bounds(value, minimum, maximum, name):
+    """Select a fixed value or the bounds of a random value of an argument.
 
-    has_min_holes = args.min_holes is not None
-    has_max_holes = args.max_holes is not None
-    if has_min_holes != has_max_holes:
-        raise ValueError("--min-holes and --max-holes must be set together")
-    n_holes = ((args.min_holes, args.max_holes)
-               if has_min_holes
-               else args.holes)
-
-    has_min_dropout = args.min_dropout is not None
-    has_max_dropout = args.max_dropout is not None
-    if has_min_dropout != has_max_dropout:
+    Returns:
+        The bounds (`minimum`, `maximum`) if they are set, `value` otherwise.
+    """
+    has_minimum = minimum is not None
+    has_maximum = maximum is not None
+    if has_minimum != has_maximum:
         raise ValueError(
-            "--min-dropout and --max-dropout must be set together")
-    dropout = ((args.min_dropout, args.max_dropout)
-               if has_min_dropout
-               else args.dropout)
+            f"--min-{name} and --max-{name} must be set together")
+    return (minimum, maximum) if has_minimum else value
+
+
+def _shoot(args):
+    mesh = data.load_mesh(str(args.input))
+
+    n_holes = _value_or_bounds(args.holes, args.min_holes, args.max_holes,
+                               "holes")
+    dropout = _value_or_bounds(args.dropout, args.min_dropout,
+                               args.max_dropout, "dropout")
 
     mask_faces = (np.load(args.mask) if args.mask is not None
                   else None)
-    faces = None if mask_faces is None else mesh.faces
+    geodesic = args.hole_metric == "geodesic"
+    faces = None if mask_faces is None and not geodesic else mesh.faces
 
     logger.info(f"setting random seed {args.seed}")
     rng = np.random.default_rng(args.seed)
 
+    kdtree = utils.build_kdtree(mesh.vertices,
+                                cache_dir=args.kdtree_cache_dir)
     point_indices = utils.shoot_holes(mesh.vertices,
                                       n_holes,
                                       dropout,
                                       mask_faces=mask_faces,
                                       faces=faces,
-                                      rng=rng)
-    shot = utils.remove_points(mesh, point_indices)
+                                      rng=rng,
+                                      kdtree=kdtree,
+                                      metric=args.hole_metric)
+    shot = utils.remove_points(mesh, point_indices,
+                               render_backend=args.render_backend,
+                               incremental_blackout=args.incremental_blackout)
 
     shot.save(str(args.output))
 
 
-def identify_meshes(dir_):
-    """List meshes and identify the challenge/track in a directory tree."""
-    meshes_track1 = list(dir_.glob("**/*_normalized.npz"))
-    meshes_track2 = list(dir_.glob("**/fusion_textured.npz"))
-    meshes_challenge2 = list(dir_.glob("**/model_*.obj"))
-    if meshes_track1:
-        meshes = sorted(meshes_track1)
-        challenge = 1
-        track = 1
-    elif meshes_track2:
-        meshes = sorted(meshes_track2)
-        challenge = 1
-        track = 2
-    elif meshes_challenge2:
-        meshes = sorted(meshes_challenge2)
-        challenge = 2
-        track = None
+def _do_slice(args):
+    with profile_to(args.profile, mesh=str(args.input)):
+        _slice(args)
+
+
+def _slice(args):
+    mesh = data.load_mesh(str(args.input))
+
+    n_slices = _value_or_bounds(args.slices, args.min_slices, args.max_slices,
+                                "slices")
+    dropout = _value_or_bounds(args.dropout, args.min_dropout,
+                               args.max_dropout, "dropout")
+
+    mask_faces = (np.load(args.mask) if args.mask is not None
+                  else None)
+    faces = None if mask_faces is None else mesh.faces
+
+    logger.info(f"setting random seed {args.seed}")
+    rng = np.random.default_rng(args.seed)
+
+    point_indices = utils.shoot_slices(mesh.vertices,
+                                       n_slices,
+                                       dropout,
+                                       mask_faces=mask_faces,
+                                       faces=faces,
+                                       rng=rng)
+    sliced = utils.remove_points(
+        mesh, point_indices,
+        render_backend=args.render_backend,
+        incremental_blackout=args.incremental_blackout)
+
+    sliced.save(str(args.output))
+
+
+# Patterns of the file names of the meshes, with their challenge and track, by
+# decreasing priority.
+MESH_PATTERNS = (
+    ("*_normalized.npz", 1, 1),
+    ("fusion_textured.npz", 1, 2),
+    ("model_*.obj", 2, None),
+)
+# Version of the format of the listing files of `scan_meshes`.
+LISTING_VERSION = 1
+
+
+def _classify_mesh(name):
+    """Challenge and track of a mesh file name, or None if not a mesh."""
+    for pattern, challenge, track in MESH_PATTERNS:
+        if fnmatch.fnmatchcase(name, pattern):
+            return challenge, track
+    return None
+
+
+def _walk_meshes(dir_):
+    """Walk a directory tree depth-first, in sorted order of the paths."""
+    try:
+        with os.scandir(dir_) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+    except OSError as e:
+        logger.warning(f"cannot list {dir_}: {e}")
+        return
+    for entry in entries:
+        path = dir_ / entry.name
+        # As `pathlib.Path.glob`, the symbolic links to directories are not
+        # followed.
+        if entry.is_dir(follow_symlinks=False):
+            yield from _walk_meshes(path)
+            continue
+        kind = _classify_mesh(entry.name)
+        if kind is not None:
+            yield (path, *kind)
+
+
+def scan_meshes(dir_, listing_path=None):
+    """Find the meshes of all the challenges/tracks in a directory tree.
+
+    The tree is traversed once, and the meshes are yielded as they are found,
+    in sorted order of their paths.
+
+    Args:
+        dir_: Root of the directory tree.
+        listing_path: (optional) Path to a listing of the meshes of the tree.
+            If it exists and lists `dir_`, the meshes are read from it without
+            traversing the tree. Otherwise, it is written after the traversal.
+            It is not updated when the tree changes: delete it to traverse the
+            tree again.
+
+    Yields:
+        (path, challenge, track) per mesh.
+    """
+    dir_ = pathlib.Path(dir_)
+    if listing_path is not None and listing_path.exists():
+        with open(listing_path) as f:
+            listing = json.load(f)
+        if (listing.get("version") == LISTING_VERSION
+                and listing["dir"] == str(dir_.resolve())):
+            logger.info(f"reading the listing {listing_path}")
+            for rel_path, challenge, track in listing["meshes"]:
+                yield dir_ / rel_path, challenge, track
+            return
+        logger.warning(f"ignoring the listing {listing_path} of another tree")
+
+    meshes = []
+    for path, challenge, track in _walk_meshes(dir_):
+        meshes.append((path.relative_to(dir_).as_posix(), challenge, track))
+        yield path, challenge, track
+
+    if listing_path is not None:
+        listing = {
+            "version": LISTING_VERSION,
+            "dir": str(dir_.resolve()),
+            "meshes": meshes,
+        }
+        with utils.atomic_write(listing_path, "w") as f:
+            json.dump(listing, f)
+        logger.info(f"saved the listing {listing_path}")
+
+
+def select_meshes(meshes):
+    """Select the meshes of the challenge/track of highest priority.
+
+    Args:
+        meshes: Iterable of (path, challenge, track), see `scan_meshes`.
+
+    Returns:
+        The paths of the selected meshes, their challenge and track (None if
+        there is no mesh).
+    """
+    meshes_by_kind = {}
+    for path, challenge, track in meshes:
+        meshes_by_kind.setdefault((challenge, track), []).append(path)
+    for _, challenge, track in MESH_PATTERNS:
+        if (challenge, track) in meshes_by_kind:
+            return meshes_by_kind[challenge, track], challenge, track
+    return [], None, None
+
+
+def identify_meshes(dir_, listing_path=None):
+    """List meshes and identify the challenge/track in a directory tree.
+
+    See `scan_meshes` for the optional listing file.
+    """
+    return select_meshes(scan_meshes(dir_, listing_path))
+
+
+def make_name_suffix(shape_index, n_shapes):
+    if n_shapes == 1:
+        return "partial"
+    else:
+        # Assuming 0 <= shape_index <= 99.
+        return f"partial-{shape_index:02d}"
+
+
+def partial_shape_path(rel_path, shape_index, n_shapes, output_dir):
+    """Path to a partial shape of the mesh at `rel_path` in the input dir."""
+    out_name_suffix = make_name_suffix(shape_index, n_shapes)
+    out_name = f"{rel_path.stem}-{out_name_suffix}.npz"
+    return output_dir / rel_path.with_name(out_name)
+
+
+def load_mask(mask_dir, rel_path):
+    mask_name = f"{rel_path.stem}-mask.npy"
+    mask_rel_path = rel_path.with_name(mask_name)
+    mask_path = mask_dir / mask_rel_path
+    logger.info(f"loading mask {mask_path}")
+    mask_faces = np.load(mask_path)
+    return mask_faces
+
+
+# Inputs of the last mesh processed by the process, reused by its shapes:
+# key -> (mesh, kdtree, indices of the valid hole centers).
+_shoot_inputs = {}
+# Blocks of shared memory attached by the process and not closed yet.
+_attached_segments = []
+
+
+def _close_attached_segments():
+    """Close the blocks of shared memory of the previous meshes.
+
+    A block cannot be closed while views of it are alive (e.g. the texture
+    kept by the renderer cache), it is then closed on a later call.
+    """
+    for shm in list(_attached_segments):
+        try:
+            shm.close()
+        except BufferError:
+            continue
+        _attached_segments.remove(shm)
+
+
+def _share_shoot_inputs(path, rel_path, mask_dir):
+    """Load a mesh and its mask into shared memory.
+
+    Returns:
+        The block of shared memory and its layout (see `data.share_mesh`).
+    """
+    logger.info(f"sharing mesh {path}")
+    with profiling.labels(mesh=rel_path.as_posix()):
+        mesh = data.load_mesh(str(path))
+        mask = (load_mask(mask_dir, rel_path) if mask_dir is not None
+                else None)
+        return data.share_mesh(mesh, mask=mask)
+
+
+def _load_shoot_inputs(path, rel_path, mask_dir, kdtree_cache_dir,
+                       shared=None, method="shoot", hole_metric="euclidean"):
+    """Load a mesh and its mask, and build its spatial index.
+
+    Args:
+        shared: (optional) Name and layout of a block of shared memory
+            holding the mesh and mask (see `_share_shoot_inputs`), attached
+            instead of loading them.
+        method: Method of generation of the partial shapes, see
+            `generate_shape`. The spatial index is only built for "shoot".
+        hole_metric: Metric of the holes, see `utils.shoot_holes`. The
+            spatial index is the KD-tree of the vertices for "euclidean", and
+            the KD-tree and the graph of the edges for "geodesic". The
+            connectivity of the faces, from which the graph is built, is
+            cached under `kdtree_cache_dir` (see `data.Mesh.load_topology`).
+
+    Returns:
+        The mesh, its spatial index (None for "slice"), and the indices of the
+        valid hole centers (None without mask).
+    """
+    if shared is not None:
+        logger.info(f"attaching shared mesh {path}")
+        shm, mesh, arrays = data.attach_mesh(*shared)
+        _attached_segments.append(shm)
+        mask = arrays.get("mask")
+    else:
+        logger.info(f"loading mesh {path}")
+        mesh = data.load_mesh(str(path))
+        mask = load_mask(mask_dir, rel_path) if mask_dir is not None else None
+    if method != "shoot":
+        index = None
     else:
-        meshes = []
-        challenge = None
-        track = None
+        index = utils.build_kdtree(mesh.vertices, cache_dir=kdtree_cache_dir)
+        if hole_metric == "geodesic":
+            if kdtree_cache_dir is not None:
+                # Cached next to the KD-trees, by path of the mesh.
+                cache_path = topology.topology_path(
+                    pathlib.Path(kdtree_cache_dir) / rel_path)
+                mesh.load_topology(cache_path)
+            with profiling.span("build_edge_graph",
+                                vertices=len(mesh.vertices),
+                                faces=len(mesh.faces)):
+                graph = utils.edge_graph(mesh.vertices, mesh.topology)
+            index = (index, graph)
+    valid_indices = (utils.valid_vertex_indices(mesh.faces, mask)
+                     if mask is not None
+                     else None)
+    return mesh, index, valid_indices
+
 
-    return meshes, challenge, track
+def _get_shoot_inputs(path, rel_path, mask_dir, kdtree_cache_dir,
+                      shared=None, method="shoot", hole_metric="euclidean"):
+    """Get the inputs of a mesh, see `_load_shoot_inputs`.
+
+    The inputs of the last mesh are kept, so that the consecutive shapes of a
+    mesh processed by the same process share them.
+    """
+    key = (path, mask_dir, kdtree_cache_dir,
+           shared[0] if shared is not None else None, method, hole_metric)
+    inputs = _shoot_inputs.get(key)
+    if inputs is None:
+        _shoot_inputs.clear()
+        _close_attached_segments()
+        inputs = _load_shoot_inputs(path, rel_path, mask_dir,
+                                    kdtree_cache_dir, shared, method,
+                                    hole_metric)
+        _shoot_inputs[key] = inputs
+    return inputs
 
 
-def shoot_helper(mesh_index,
-                 path,
+# Methods of generation of the partial shapes.
+METHODS = ("shoot", "slice")
+
+
+# Texture of the last partial shape of the process, by shape, reused by the
+# next shape once the last one is saved.
+_partial_textures = {}
+
+
+def _get_partial_texture(mesh):
+    """Get the texture of the partial shapes of a mesh, to overwrite."""
+    shape = mesh.texture.shape[:2] + (3,)
+    texture = _partial_textures.get(shape)
+    if texture is None:
+        _partial_textures.clear()
+        texture = np.empty(shape)
+        _partial_textures[shape] = texture
+    return texture
+
+
+def generate_shape(mesh, index, valid_indices, shape_seed, n_holes, dropout,
+                   render_backend="gl", incremental_blackout=False,
+                   method="shoot", hole_metric="euclidean", texture_out=None):
+    """Generate a partial shape of a mesh.
+
+    Args:
+        index: The spatial index of the mesh, see `_load_shoot_inputs`.
+        method: "shoot" to cut holes (see `utils.shoot_holes`), or "slice" to
+            slice off parts of the mesh by planes (see `utils.shoot_slices`),
+            with `n_holes` as the number of slices.
+        hole_metric: Metric of the holes, see `utils.shoot_holes`.
+        texture_out: (optional) Array where to write the texture of the shape
+            with `incremental_blackout`, see `utils.remove_points`.
+    """
+    logger.info(f"shape seed = {shape_seed}")
+    shape_rng = np.random.default_rng(shape_seed)
+    if method == "shoot":
+        kdtree, graph = (index if hole_metric == "geodesic"
+                         else (index, None))
+        point_indices = utils.shoot_holes(mesh.vertices,
+                                          n_holes,
+                                          dropout,
+                                          rng=shape_rng,
+                                          # Parallelised over processes.
+                                          workers=1,
+                                          kdtree=kdtree,
+                                          valid_indices=valid_indices,
+                                          metric=hole_metric,
+                                          graph=graph)
+    elif method == "slice":
+        point_indices = utils.shoot_slices(mesh.vertices,
+                                           n_holes,
+                                           dropout,
+                                           rng=shape_rng,
+                                           valid_indices=valid_indices)
+    else:
+        raise ValueError(f"unknown method {method}")
+    return utils.remove_points(mesh, point_indices,
+                               render_backend=render_backend,
+                               incremental_blackout=incremental_blackout,
+                               texture_out=texture_out)
+
+
+def save_atomic(mesh, path, **kwargs):
+    """Save a mesh through a temporary file renamed to `path`.
+
+    An interrupted save does not leave a truncated file at `path` (see
+    `utils.atomic_write`). Extra keyword arguments are passed to
+    `data.save_mesh`.
+    """
+    with utils.atomic_write(path, mode=None) as tmp_path:
+        mesh.save(tmp_path, **kwargs)
+
+
+# Name of the manifest of the runs of `shoot_dir` in the output directory.
+MANIFEST_NAME = "manifest.jsonl"
+
+
+def read_manifest(path):
+    """Read the records of a manifest of runs.
+
+    The manifest is a JSON Lines file to which each run appends a "run" record
+    with its parameters and a "shape" record per finished shape. An incomplete
+    last line, e.g. from an interrupted run, is ignored.
+
+    Returns:
+        The list of the records, or an empty list if there is no manifest.
+    """
+    records = []
+    try:
+        f = open(path)
+    except FileNotFoundError:
+        return records
+    with f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"ignoring invalid record in {path}")
+    return records
+
+
+def open_manifest(path):
+    """Open a manifest of runs to append records to it."""
+    path = pathlib.Path(path)
+    is_terminated = True
+    if path.exists() and path.stat().st_size > 0:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            is_terminated = f.read(1) == b"\n"
+    f = open(path, "a")
+    if not is_terminated:
+        # Terminate the incomplete last record of an interrupted run.
+        f.write("\n")
+    return f
+
+
+def append_record(f, record):
+    """Append a record to an open manifest and flush it to the file."""
+    f.write(json.dumps(record) + "\n")
+    f.flush()
+
+
+def shoot_helper(path,
+                 shape_index,
+                 shape_seed,
+                 n_shapes,
                  n_holes,
                  dropout,
-                 shape_seeds,
-                 n_meshes,
                  input_dir,
                  output_dir,
                  mask_dir=None,
+                 render_backend="gl",
+                 incremental_blackout=False,
+                 kdtree_cache_dir=None,
+                 shared=None,
+                 compresslevel=None,
+                 profile=False,
+                 method="shoot",
+                 hole_metric="euclidean",
                  ):
-    logger.info(f"{mesh_index + 1}/{n_meshes} processing {path}")
+    """Generate a partial shape of a mesh.
+
+    Args:
+        shared: (optional) Name and layout of a block of shared memory
+            holding the mesh and mask, see `_load_shoot_inputs`.
+        compresslevel: (optional) Compression of the output, see
+            `data.save_npz`.
+        profile: Whether to record the profiling spans of the process.
+        method: Method of generation, see `generate_shape`.
+        hole_metric: Metric of the holes, see `utils.shoot_holes`.
 
+    Returns:
+        The path to the partial shape, and the profiling spans recorded by the
+        process since its previous task.
+    """
+    if profile:
+        profiling.enable()
     rel_path = path.relative_to(input_dir)
+    out_path = partial_shape_path(rel_path, shape_index, n_shapes, output_dir)
+    logger.info(f"generating shape {shape_index + 1}/{n_shapes} of {path}")
 
-    # Lazily load the mesh and mask when it is sure they are needed.
-    mesh_cached = None
-    mask_cached = None
-
-    def make_name_suffix(shape_index, n_shapes):
-        if n_shapes == 1:
-            return "partial"
-        else:
-            # Assuming 0 <= shape_index <= 99.
-            return f"partial-{shape_index:02d}"
-
-    def load_mask(rel_path):
-        mask_name = f"{rel_path.stem}-mask.npy"
-        mask_rel_path = rel_path.with_name(mask_name)
-        mask_path = mask_dir / mask_rel_path
-        logger.info(f"loading mask {mask_path}")
-        mask_faces = np.load(mask_path)
-        return mask_faces
-
-    n_shapes = len(shape_seeds)
-    for shape_index, shape_seed in enumerate(shape_seeds):
-        out_name_suffix = make_name_suffix(shape_index, n_shapes)
-        out_name = f"{rel_path.stem}-{out_name_suffix}.npz"
-        out_rel_path = rel_path.with_name(out_name)
-        out_path = output_dir / out_rel_path
-
-        if out_path.exists():
-            logger.warning(f"shape exists, skipping {out_path}")
-            continue
+    with profiling.labels(mesh=rel_path.as_posix()):
+        inputs = _get_shoot_inputs(path, rel_path, mask_dir,
+                                   kdtree_cache_dir, shared, method,
+                                   hole_metric)
+        # The shape is saved before the next one is generated, so that its
+        # texture can be overwritten by the next one.
+        mesh = inputs[0]
+        texture_out = (_get_partial_texture(mesh)
+                       if (incremental_blackout
+                           and mesh.texture_indices is not None
+                           and mesh.texture is not None)
+                       else None)
+        with profiling.labels(shape=shape_index):
+            partial = generate_shape(*inputs, shape_seed, n_holes, dropout,
+                                     render_backend=render_backend,
+                                     incremental_blackout=incremental_blackout,
+                                     method=method,
+                                     hole_metric=hole_metric,
+                                     texture_out=texture_out)
 
-        logger.info(f"generating shape {shape_index + 1}/{n_shapes}")
+            logger.info(f"saving {out_path}")
+            save_atomic(partial, out_path, compresslevel=compresslevel)
+    return out_path, profiling.collect()
 
-        out_path.parent.mkdir(parents=True, exist_ok=True)
 
-        if mesh_cached is None:
-            mesh_cached = data.load_mesh(str(path))
-        if mask_cached is None and mask_dir is not None:
-            mask_cached = load_mask(rel_path)
+def shoot_worker(task_queue,
+                 result_queue,
+                 n_shapes,
+                 n_holes,
+                 dropout,
+                 input_dir,
+                 output_dir,
+                 mask_dir=None,
+                 render_backend="gl",
+                 incremental_blackout=False,
+                 kdtree_cache_dir=None,
+                 compresslevel=None,
+                 n_writers=2,
+                 profile=False,
+                 method="shoot",
+                 hole_metric="euclidean",
+                 ):
+    """Generate partial shapes in a pipeline of three stages.
 
-        mesh = mesh_cached
-        mask = mask_cached
+    A prefetch thread takes the next mesh from `task_queue` and loads it while
+    the partial shapes of the current mesh are generated. The shapes are saved
+    by a pool of `n_writers` threads, with at most `2 * n_writers` shapes
+    waiting to be saved.
 
-        logger.info(f"shape seed = {shape_seed}")
-        shape_rng = np.random.default_rng(shape_seed)
-        point_indices = utils.shoot_holes(mesh.vertices,
-                                          n_holes,
-                                          dropout,
-                                          mask_faces=mask,
-                                          faces=mesh.faces,
-                                          rng=shape_rng)
-        partial = utils.remove_points(mesh, point_indices)
+    Args:
+        task_queue: Queue of (mesh path, [(shape index, shape seed), ...])
+            tasks, ended by None.
+        result_queue: Queue receiving a (mesh path, shape index, shape seed,
+            error message or None, profiling spans) result per shape, once it
+            is saved. The spans are the ones recorded by the process since the
+            previous result.
+        profile: Whether to record the profiling spans of the process.
+        method: Method of generation, see `generate_shape`.
+        hole_metric: Metric of the holes, see `utils.shoot_holes`.
+    """
+    if profile:
+        profiling.enable()
+    loaded = queue.Queue(maxsize=1)
 
-        logger.info(f"{shape_index + 1}/{n_shapes} saving {out_path}")
-        partial.save(str(out_path))
+    def prefetch():
+        while True:
+            task = task_queue.get()
+            if task is None:
+                loaded.put(None)
+                return
+            path, shapes = task
+            rel_path = path.relative_to(input_dir)
+            try:
+                with profiling.labels(mesh=rel_path.as_posix()):
+                    inputs = _load_shoot_inputs(path, rel_path, mask_dir,
+                                                kdtree_cache_dir,
+                                                method=method,
+                                                hole_metric=hole_metric)
+                    # Decode the lazy attributes here rather than when
+                    # computing.
+                    inputs[0].texture
+                    inputs[0].texcoords
+                    inputs[0].texture_indices
+            except Exception as e:
+                logger.exception(f"failed to load {path}")
+                loaded.put((path, shapes, None, repr(e)))
+            else:
+                loaded.put((path, shapes, inputs, None))
+                inputs = None
+
+    slots = threading.BoundedSemaphore(2 * n_writers)
+
+    def write(partial, out_path, path, shape_index, shape_seed):
+        error = None
+        try:
+            logger.info(f"saving {out_path}")
+            rel_path = path.relative_to(input_dir)
+            with profiling.labels(mesh=rel_path.as_posix(),
+                                  shape=shape_index):
+                save_atomic(partial, out_path, compresslevel=compresslevel)
+        except Exception as e:
+            logger.exception(f"failed to save {out_path}")
+            error = repr(e)
+        finally:
+            slots.release()
+        result_queue.put((path, shape_index, shape_seed, error,
+                          profiling.collect()))
+
+    threading.Thread(target=prefetch, daemon=True).start()
+    writers = concurrent.futures.ThreadPoolExecutor(max_workers=n_writers)
+    with writers:
+        while True:
+            item = loaded.get()
+            if item is None:
+                break
+            path, shapes, inputs, error = item
+            if error is not None:
+                for shape_index, shape_seed in shapes:
+                    result_queue.put((path, shape_index, shape_seed, error,
+                                      profiling.collect()))
+                continue
+
+            rel_path = path.relative_to(input_dir)
+            for shape_index, shape_seed in shapes:
+                logger.info(
+                    f"generating shape {shape_index + 1}/{n_shapes} of {path}")
+                try:
+                    with profiling.labels(mesh=rel_path.as_posix(),
+                                          shape=shape_index):
+                        partial = generate_shape(
+                            *inputs, shape_seed, n_holes, dropout,
+                            render_backend=render_backend,
+                            incremental_blackout=incremental_blackout,
+                            method=method,
+                            hole_metric=hole_metric)
+                except Exception as e:
+                    logger.exception(
+                        f"failed to generate shape"
+                        f" {shape_index + 1}/{n_shapes} of {path}")
+                    result_queue.put((path, shape_index, shape_seed, repr(e),
+                                      profiling.collect()))
+                    continue
+                out_path = partial_shape_path(rel_path, shape_index, n_shapes,
+                                              output_dir)
+                slots.acquire()
+                writers.submit(write, partial, out_path, path, shape_index,
+                               shape_seed)
+            # Release the mesh before waiting for the next one.
+            inputs = partial = None
+
+
+def _shoot_pipelined(mesh_tasks, n_workers, **kwargs):
+    """Generate partial shapes with pipelined worker processes.
+
+    The meshes are distributed to the workers (see `shoot_worker`) in order,
+    through a shared queue.
+
+    Args:
+        mesh_tasks: List of (mesh path, [(shape index, shape seed), ...]).
+        n_workers: Number of worker processes.
+        kwargs: Arguments of `shoot_worker`.
+
+    Yields:
+        (mesh path, shape index, shape seed, error message or None, profiling
+        spans) for each shape, as they are saved. The shapes of workers that
+        exited unexpectedly are reported last, as failed.
+    """
+    task_queue = multiprocessing.Queue()
+    result_queue = multiprocessing.Queue()
+    for task in mesh_tasks:
+        task_queue.put(task)
+    for _ in range(n_workers):
+        task_queue.put(None)
+
+    workers = [multiprocessing.Process(target=shoot_worker,
+                                       args=(task_queue, result_queue),
+                                       kwargs=kwargs)
+               for _ in range(n_workers)]
+    for worker in workers:
+        worker.start()
+
+    unfinished = {(path, shape_index): shape_seed
+                  for path, shapes in mesh_tasks
+                  for shape_index, shape_seed in shapes}
+    try:
+        while unfinished:
+            try:
+                result = result_queue.get(timeout=1)
+            except queue.Empty:
+                if any(worker.is_alive() for worker in workers):
+                    continue
+                # Results sent by the workers just before exiting.
+                try:
+                    result = result_queue.get(timeout=1)
+                except queue.Empty:
+                    break
+            path, shape_index, _, _, _ = result
+            del unfinished[(path, shape_index)]
+            yield result
+        for (path, shape_index), shape_seed in unfinished.items():
+            yield (path, shape_index, shape_seed, "worker exited unexpectedly",
+                   [])
+    finally:
+        for worker in workers:
+            if unfinished:
+                worker.terminate()
+            worker.join()
+
+
+def _shoot_pooled(mesh_tasks, n_workers, shared_memory=False, **kwargs):
+    """Generate partial shapes with a pool of worker processes.
+
+    Each partial shape is a task, see `shoot_helper`.
+
+    Args:
+        mesh_tasks: List of (mesh path, [(shape index, shape seed), ...]).
+        n_workers: Number of worker processes. The number of processors if
+            None.
+        shared_memory: Whether to load each mesh in the main process into
+            shared memory for the workers. At most `n_workers` meshes are held
+            in shared memory at once.
+        kwargs: Arguments of `shoot_helper`.
+
+    Yields:
+        (mesh path, shape index, shape seed, error message or None, profiling
+        spans) for each shape, as they are saved. The spans of the main
+        process (e.g. loading the meshes into shared memory) are included.
+    """
+    input_dir = kwargs["input_dir"]
+    mask_dir = kwargs["mask_dir"]
+    n_shapes = kwargs["n_shapes"]
+    if shared_memory:
+        # Meshes held in shared memory at once.
+        max_meshes = n_workers if n_workers is not None else os.cpu_count()
+    else:
+        max_meshes = len(mesh_tasks)
+
+    # Future -> (mesh path, shape index, shape seed).
+    pending = {}
+    # Mesh path -> number of unfinished shapes.
+    remaining = {}
+    # Mesh path -> block of shared memory.
+    segments = {}
+    mesh_tasks = iter(mesh_tasks)
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=n_workers)
+    with executor:
+        try:
+            while True:
+                # Submit the shapes of the next meshes.
+                while len(remaining) < max_meshes:
+                    path, shapes = next(mesh_tasks, (None, None))
+                    if path is None:
+                        break
+                    shared = None
+                    if shared_memory:
+                        rel_path = path.relative_to(input_dir)
+                        try:
+                            shm, layout = _share_shoot_inputs(path, rel_path,
+                                                              mask_dir)
+                        except Exception as e:
+                            logger.exception(f"failed to load {path}")
+                            for shape_index, shape_seed in shapes:
+                                yield (path, shape_index, shape_seed, repr(e),
+                                       profiling.collect())
+                            continue
+                        segments[path] = shm
+                        shared = (shm.name, layout)
+                    for shape_index, shape_seed in shapes:
+                        future = executor.submit(shoot_helper,
+                                                 path,
+                                                 shape_index,
+                                                 shape_seed,
+                                                 shared=shared,
+                                                 **kwargs)
+                        pending[future] = (path, shape_index, shape_seed)
+                    remaining[path] = len(shapes)
+
+                if not pending:
+                    break
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    path, shape_index, shape_seed = pending.pop(future)
+                    error = None
+                    spans = []
+                    try:
+                        _, spans = future.result()
+                    except Exception as e:
+                        logger.exception(
+                            f"failed to generate shape"
+                            f" {shape_index + 1}/{n_shapes} of {path}")
+                        error = repr(e)
+
+                    remaining[path] -= 1
+                    if remaining[path] == 0:
+                        del remaining[path]
+                        shm = segments.pop(path, None)
+                        if shm is not None:
+                            shm.close()
+                            shm.unlink()
+                    yield (path, shape_index, shape_seed, error,
+                           spans + profiling.collect())
+        finally:
+            for shm in segments.values():
+                shm.close()
+                shm.unlink()
 
 
 def _do_shoot_dir(args):
@@ -159,27 +883,78 @@ def _do_shoot_dir(args):
     created in advance for each partial shape. The process is thus reproducible
     and can also be interrupted and resumed without generating all the previous
     shapes.
+
+    Each partial shape is an independent task. The tasks are scheduled by
+    decreasing size of the mesh files, so that the longest ones do not delay
+    the end of the run. The command exits with a non-zero status if any shape
+    fails.
+
+    With `args.shared_memory`, each mesh is loaded once by the main process
+    into shared memory, and the workers attach to it instead of loading it
+    (see `_shoot_pooled`).
+
+    With `args.pipeline`, each worker instead takes whole meshes and overlaps
+    the loading of the next mesh, the generation of the shapes and their
+    saving (see `shoot_worker`).
+
+    With `args.profile`, the profiling spans of the workers are written as
+    they finish their shapes, followed by the summary of the run (see
+    `profiling`).
+
+    With `args.method` "slice" (the `slice_dir` command), parts of the meshes
+    are sliced off by planes instead of cutting holes, with `args.slices`
+    slices per shape (see `generate_shape`).
+
+    With `args.hole_metric` "geodesic", the holes are grown along the edges of
+    the meshes (see `utils.shoot_holes`).
     """
     input_dir = args.input_dir
     output_dir = args.output_dir
     mask_dir = args.mask_dir
     seed = args.seed
-    n_holes = args.holes
+    method = args.method
+    # Number of holes or slices.
+    n_holes = args.holes if method == "shoot" else args.slices
+    hole_metric = args.hole_metric
     dropout = args.dropout
     n_shapes = args.n_shapes
     n_workers = args.n_workers
+    render_backend = args.render_backend
+    incremental_blackout = args.incremental_blackout
+    kdtree_cache_dir = args.kdtree_cache_dir
+    shared_memory = args.shared_memory
+    pipeline = args.pipeline
+    n_writers = args.n_writers
+    compresslevel = args.compression_level
+    listing_path = args.listing
+    profile_path = args.profile
+    overwrite = args.overwrite
+    if pipeline and shared_memory:
+        raise ValueError("--pipeline and --shared-memory are exclusive")
 
     logger.info("generating partial data in directory tree")
     logger.info(f"input dir = {input_dir}")
     logger.info(f"output dir = {output_dir}")
     logger.info(f"mask dir = {mask_dir}")
     logger.info(f"seed = {seed}")
-    logger.info(f"holes = {n_holes}")
+    logger.info(f"method = {method}")
+    logger.info(f"{'holes' if method == 'shoot' else 'slices'} = {n_holes}")
+    logger.info(f"hole_metric = {hole_metric}")
     logger.info(f"dropout = {dropout}")
     logger.info(f"n_shapes = {n_shapes}")
     logger.info(f"n_workers = {n_workers}")
+    logger.info(f"render_backend = {render_backend}")
+    logger.info(f"incremental_blackout = {incremental_blackout}")
+    logger.info(f"kdtree_cache_dir = {kdtree_cache_dir}")
+    logger.info(f"shared_memory = {shared_memory}")
+    logger.info(f"pipeline = {pipeline}")
+    logger.info(f"n_writers = {n_writers}")
+    logger.info(f"compression_level = {compresslevel}")
+    logger.info(f"listing = {listing_path}")
+    logger.info(f"profile = {profile_path}")
+    logger.info(f"overwrite = {overwrite}")
 
-    mesh_paths, challenge, track = identify_meshes(input_dir)
+    mesh_paths, challenge, track = identify_meshes(input_dir, listing_path)
     if challenge is None:
         raise ValueError(f"could not identify meshes in {input_dir}")
     logger.info(f"detected challenge {challenge} track {track}")
@@ -195,20 +970,495 @@ def _do_shoot_dir(args):
     # - parallelised.
     seeds = rng.integers(1e12, size=(n_meshes, n_shapes))
 
-    mesh_indices = range(n_meshes)
-    with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as executor:
-        executor.map(
-            shoot_helper,
-            mesh_indices,
-            mesh_paths,
-            itertools.repeat(n_holes),
-            itertools.repeat(dropout),
-            seeds.tolist(),
-            itertools.repeat(n_meshes),
-            itertools.repeat(input_dir),
-            itertools.repeat(output_dir),
-            itertools.repeat(mask_dir),
-        )
+    # Parameters determining the partial shapes. (The method and the metric
+    # are not recorded for the Euclidean holes, as by older versions.)
+    parameters = dict(seed=seed,
+                      dropout=dropout,
+                      n_shapes=n_shapes,
+                      mask_dir=str(mask_dir) if mask_dir is not None else None,
+                      render_backend=render_backend,
+                      incremental_blackout=incremental_blackout)
+    if method == "shoot":
+        parameters.update(holes=n_holes)
+        if hole_metric != "euclidean":
+            parameters.update(hole_metric=hole_metric)
+    else:
+        parameters.update(method=method, slices=n_holes)
+    manifest_path = output_dir / MANIFEST_NAME
+    records = read_manifest(manifest_path)
+    runs = [record for record in records if record["event"] == "run"]
+    if runs and runs[-1]["parameters"] != parameters and not overwrite:
+        # E.g. `shoot_dir` into the output directory of `slice_dir`, with the
+        # same names of outputs.
+        raise ValueError(f"the previous run in {manifest_path} used different"
+                         f" parameters: {runs[-1]['parameters']}. Use"
+                         f" --overwrite to generate all the shapes again with"
+                         f" the new parameters.")
+    # Shapes finished with the current parameters since the last run that
+    # overwrote them.
+    finished = set()
+    is_current = False
+    for record in records:
+        if record["event"] == "run":
+            is_current = record["parameters"] == parameters
+            if not is_current or record.get("overwrite"):
+                finished.clear()
+        elif (record["event"] == "shape" and record["status"] == "ok"
+                and is_current):
+            finished.add(record["output"])
+    if overwrite:
+        finished.clear()
+
+    tasks = []
+    # Shapes found without manifest, recorded in the new one.
+    unrecorded = []
+    for path, shape_seeds in zip(mesh_paths, seeds.tolist()):
+        rel_path = path.relative_to(input_dir)
+        for shape_index, shape_seed in enumerate(shape_seeds):
+            out_path = partial_shape_path(rel_path, shape_index, n_shapes,
+                                          output_dir)
+            if runs or overwrite:
+                out_rel_path = out_path.relative_to(output_dir)
+                exists = out_rel_path.as_posix() in finished
+            else:
+                # Output directory without manifest, e.g. of an older version.
+                exists = out_path.exists()
+                if exists:
+                    unrecorded.append((path, shape_index, shape_seed))
+            if exists:
+                continue
+            tasks.append((path, shape_index, shape_seed))
+    n_skipped = n_meshes * n_shapes - len(tasks)
+
+    # Largest meshes first, with the file size as estimate of the cost. The
+    # shapes of a mesh stay consecutive (stable sort).
+    sizes = {path: path.stat().st_size for path in mesh_paths}
+    tasks.sort(key=lambda task: sizes[task[0]], reverse=True)
+
+    # Shapes to generate per mesh, in order.
+    mesh_tasks = [
+        (path, [(shape_index, shape_seed)
+                for _, shape_index, shape_seed in path_tasks])
+        for path, path_tasks in itertools.groupby(tasks,
+                                                  key=lambda task: task[0])
+    ]
+    n_tasks = len(tasks)
+    logger.info(f"generating {n_tasks} shapes ({n_skipped} existing)")
+    failures = []
+    n_finished = 0
+    start_time = time.perf_counter()
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = open_manifest(manifest_path)
+    append_record(manifest, {
+        "event": "run",
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "input_dir": str(input_dir),
+        "parameters": parameters,
+        "overwrite": overwrite,
+    })
+
+    def record_shape(path, shape_index, shape_seed, error=None):
+        rel_path = path.relative_to(input_dir)
+        out_path = partial_shape_path(rel_path, shape_index, n_shapes,
+                                      output_dir)
+        record = {
+            "event": "shape",
+            "mesh": rel_path.as_posix(),
+            "shape_index": shape_index,
+            "seed": shape_seed,
+            "output": out_path.relative_to(output_dir).as_posix(),
+            "status": "ok" if error is None else "error",
+        }
+        if error is not None:
+            record["error"] = error
+        append_record(manifest, record)
+
+    for path, shape_index, shape_seed in unrecorded:
+        record_shape(path, shape_index, shape_seed)
+
+    kwargs = dict(n_shapes=n_shapes,
+                  n_holes=n_holes,
+                  dropout=dropout,
+                  input_dir=input_dir,
+                  output_dir=output_dir,
+                  mask_dir=mask_dir,
+                  render_backend=render_backend,
+                  incremental_blackout=incremental_blackout,
+                  kdtree_cache_dir=kdtree_cache_dir,
+                  compresslevel=compresslevel,
+                  profile=profile_path is not None,
+                  method=method,
+                  hole_metric=hole_metric)
+    spans = []
+    if profile_path is not None:
+        profiling.enable()
+        profile = open(profile_path, "w")
+    else:
+        profile = contextlib.nullcontext()
+    if pipeline:
+        results = _shoot_pipelined(mesh_tasks,
+                                   n_workers or os.cpu_count(),
+                                   n_writers=n_writers,
+                                   **kwargs)
+    else:
+        results = _shoot_pooled(mesh_tasks, n_workers, shared_memory,
+                                **kwargs)
+    with manifest, profile:
+        for path, shape_index, shape_seed, error, shape_spans in results:
+            record_shape(path, shape_index, shape_seed, error)
+            if profile_path is not None:
+                write_spans(profile, shape_spans)
+                spans += shape_spans
+            if error is not None:
+                failures.append((path, shape_index))
+            n_finished += 1
+            elapsed = time.perf_counter() - start_time
+            logger.info(f"{n_finished}/{n_tasks} shapes finished"
+                        f" ({len(failures)} failed),"
+                        f" {n_finished / max(elapsed, 1e-9):.2f} shapes/s")
+        if profile_path is not None:
+            main_spans = profiling.collect()
+            write_spans(profile, main_spans)
+            write_spans(profile, profiling.summarize(spans + main_spans))
+
+    elapsed = time.perf_counter() - start_time
+    n_done = n_tasks - len(failures)
+    logger.info(f"generated {n_done} shapes in {elapsed:.1f} s"
+                f" ({n_done / max(elapsed, 1e-9):.2f} shapes/s),"
+                f" {n_skipped} existing, {len(failures)} failed")
+    if failures:
+        for path, shape_index in failures:
+            logger.error(
+                f"failed shape {shape_index + 1}/{n_shapes} of {path}")
+        sys.exit(1)
+
+
+def _do_evaluate(args):
+    workers = -1 if args.n_workers is None else args.n_workers
+    results = evaluation.evaluate_paths(args.reference,
+                                        args.estimate,
+                                        n_samples=args.n_samples,
+                                        seed=args.seed,
+                                        workers=workers)
+
+    text = json.dumps(results, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        args.output.write_text(text + "\n")
+
+
+# Suffixes of the predictions, by order of preference.
+PREDICTION_SUFFIXES = (".npz", ".obj", ".npmap")
+
+
+def find_prediction(reference_path, reference_dir, prediction_dir):
+    """Find the prediction of a reference mesh.
+
+    The prediction of the reference `<reference_dir>/.../<scan_name>/*` is
+    expected at `<prediction_dir>/.../<scan_name>/<scan_name>-completed.*`
+    (see the submission format of the challenges).
+
+    Returns:
+        The path to the prediction, or None if missing.
+    """
+    rel_dir = reference_path.parent.relative_to(reference_dir)
+    scan_name = reference_path.parent.name
+    for suffix in PREDICTION_SUFFIXES:
+        path = prediction_dir / rel_dir / f"{scan_name}-completed{suffix}"
+        if path.exists():
+            return path
+    return None
+
+
+def evaluate_helper(reference_path, prediction_path, cache_dir, n_samples,
+                    seed, texture):
+    logger.info(f"evaluating {prediction_path}")
+    row = {
+        "reference": str(reference_path),
+        "prediction": str(prediction_path),
+    }
+    try:
+        results = evaluation.evaluate_paths_cached(reference_path,
+                                                   prediction_path,
+                                                   cache_dir=cache_dir,
+                                                   n_samples=n_samples,
+                                                   seed=seed,
+                                                   # Parallelised over
+                                                   # processes.
+                                                   workers=1,
+                                                   texture=texture)
+    except Exception as e:
+        logger.exception(f"failed to evaluate {prediction_path}")
+        row["status"] = "error"
+        row["error"] = repr(e)
+        return row
+    row["status"] = "ok"
+    row.update(results)
+    return row
+
+
+def aggregate_results(rows):
+    """Average the metrics over the evaluated pairs."""
+    evaluated = [row for row in rows if row["status"] == "ok"]
+    aggregates = {
+        "n_evaluated": len(evaluated),
+        "n_missing": sum(row["status"] == "missing" for row in rows),
+        "n_errors": sum(row["status"] == "error" for row in rows),
+    }
+    metrics = sorted({key for row in evaluated for key in row
+                      if isinstance(row[key], (int, float))})
+    for metric in metrics:
+        values = [row[metric] for row in evaluated if metric in row]
+        aggregates[metric] = float(np.mean(values))
+    return aggregates
+
+
+def _do_evaluate_dir(args):
+    """Evaluate the predictions of a directory tree of reference meshes.
+
+    The reference meshes are identified as in `shoot_dir`. The results of each
+    pair of meshes are cached, so that only the changed predictions are
+    evaluated again.
+    """
+    reference_dir = args.reference_dir
+    prediction_dir = args.prediction_dir
+    output_dir = args.output_dir
+    if args.no_cache:
+        cache_dir = None
+    elif args.cache_dir is not None:
+        cache_dir = args.cache_dir
+    else:
+        cache_dir = output_dir / "cache"
+    seed = args.seed
+    n_samples = args.n_samples
+    n_workers = args.n_workers
+    listing_path = args.listing
+
+    logger.info("evaluating predictions in directory tree")
+    logger.info(f"reference dir = {reference_dir}")
+    logger.info(f"prediction dir = {prediction_dir}")
+    logger.info(f"output dir = {output_dir}")
+    logger.info(f"cache dir = {cache_dir}")
+    logger.info(f"seed = {seed}")
+    logger.info(f"n_samples = {n_samples}")
+    logger.info(f"n_workers = {n_workers}")
+    logger.info(f"listing = {listing_path}")
+
+    # Rows of the results per (challenge, track), as futures for the pairs
+    # being evaluated. The pairs are evaluated as soon as the references are
+    # found. Only the ones of the challenge/track of highest priority are kept
+    # (see `select_meshes`), trees usually contain a single one.
+    rows_by_kind = {}
+    n_references = 0
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=n_workers)
+    with executor:
+        for reference, challenge, track in scan_meshes(reference_dir,
+                                                       listing_path):
+            n_references += 1
+            kind_rows = rows_by_kind.setdefault((challenge, track), [])
+            prediction = find_prediction(reference, reference_dir,
+                                         prediction_dir)
+            if prediction is None:
+                kind_rows.append({"reference": str(reference),
+                                  "prediction": None,
+                                  "status": "missing"})
+                continue
+            # The texture is not evaluated in track 2 of challenge 1.
+            texture = not (challenge == 1 and track == 2)
+            kind_rows.append(executor.submit(evaluate_helper,
+                                             reference,
+                                             prediction,
+                                             cache_dir,
+                                             n_samples,
+                                             seed,
+                                             texture))
+        logger.info(f"found {n_references} reference meshes")
+
+        _, challenge, track = select_meshes(
+            (None, *kind) for kind in rows_by_kind)
+        if challenge is None:
+            raise ValueError(f"could not identify meshes in {reference_dir}")
+        for kind, kind_rows in rows_by_kind.items():
+            if kind != (challenge, track):
+                for row in kind_rows:
+                    if isinstance(row, concurrent.futures.Future):
+                        row.cancel()
+        logger.info(f"evaluating the meshes of challenge {challenge}"
+                    + ("" if track is None else f" track {track}"))
+
+        rows = []
+        for row in rows_by_kind[challenge, track]:
+            if isinstance(row, concurrent.futures.Future):
+                row = row.result()
+            elif row["status"] == "missing":
+                logger.warning(f"missing prediction for {row['reference']}")
+            rows.append(row)
+    rows.sort(key=lambda row: row["reference"])
+
+    aggregates = aggregate_results(rows)
+    logger.info(f"aggregates = {aggregates}")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / "results.json", "w") as f:
+        json.dump({"aggregates": aggregates, "results": rows}, f, indent=2)
+    fieldnames = ["reference", "prediction", "status"]
+    fieldnames += sorted({key for row in rows for key in row}
+                         - set(fieldnames))
+    with open(output_dir / "results.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _add_shape_arguments(parser):
+    """Add the arguments common to the commands generating a partial shape."""
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Initial state for the pseudo random number generator."
+             " If not set, the initial state is not set explicitly.",
+    )
+    parser.add_argument(
+        "--mask", type=pathlib.Path,
+        help=" (optional) Path to the mask (.npy) to generate the partial data"
+             " only on regions considered for evaluation.",
+    )
+    parser.add_argument(
+        "--render-backend",
+        choices=utils.RENDER_BACKENDS,
+        default="gl",
+        help="Backend for rendering the texture of the partial data:"
+             " 'gl' (OpenGL, default) or 'cpu' (software rasterization, no"
+             " OpenGL context required).",
+    )
+    parser.add_argument(
+        "--incremental-blackout",
+        action="store_true",
+        help="Black out the texture of the removed faces only, starting from"
+             " the texture of the whole mesh, instead of re-rendering the"
+             " texture of the kept faces. Faster for small holes and several"
+             " shapes per mesh. Uses software rasterization.",
+    )
+    parser.add_argument(
+        "--profile",
+        type=pathlib.Path,
+        default=None,
+        help="(optional) JSON Lines file where to write the durations of the"
+             " processing stages (loading, spatial index, neighbour queries,"
+             " point removal, texture rendering, saving), with their numbers"
+             " of vertices, faces and texels, followed by their summary.",
+    )
+
+
+def _add_shape_dir_arguments(parser):
+    """Add the arguments common to the commands on directory trees."""
+    parser.add_argument(
+        "--mask-dir",
+        type=pathlib.Path,
+        help=" (optional) Directory tree with the masks (.npy). If defined,"
+             " the partial data is created only on the non-masked faces of the"
+             " meshes. (Only valid for challenge 1.)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Initial state for the pseudo random number generator."
+             " If not set, the initial state is not set explicitly.",
+    )
+    parser.add_argument(
+        "-n", "--n-shapes",
+        type=int,
+        default=1,
+        help="Number of partial shapes to generate per mesh."
+             " If n = 1 (default), the shape is saved as"
+             " '<mesh_name>-partial.npz'."
+             " If n > 1, the shapes are saved as '<mesh_name>-partial-XY.npz'"
+             ", with XY as 00, 01, 02... (assuming n <= 99).",
+    )
+    parser.add_argument(
+        "--n-workers",
+        type=int,
+        default=None,
+        help="Number of parallel processes. By default, the number of"
+             " available processors.",
+    )
+    parser.add_argument(
+        "--render-backend",
+        choices=utils.RENDER_BACKENDS,
+        default="gl",
+        help="Backend for rendering the texture of the partial data:"
+             " 'gl' (OpenGL, default) or 'cpu' (software rasterization, no"
+             " OpenGL context required).",
+    )
+    parser.add_argument(
+        "--incremental-blackout",
+        action="store_true",
+        help="Black out the texture of the removed faces only, starting from"
+             " the texture of the whole mesh, instead of re-rendering the"
+             " texture of the kept faces. Faster for small holes and several"
+             " shapes per mesh. Uses software rasterization.",
+    )
+    parser.add_argument(
+        "--shared-memory",
+        action="store_true",
+        help="Load each mesh once in the main process and share it with the"
+             " workers through shared memory, instead of loading it in each"
+             " worker.",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Distribute whole meshes to the workers, which load the next"
+             " mesh and save the shapes in background threads while"
+             " generating the shapes.",
+    )
+    parser.add_argument(
+        "--n-writers",
+        type=int,
+        default=2,
+        help="Number of threads saving the shapes per worker, with"
+             " --pipeline.",
+    )
+    parser.add_argument(
+        "--compression-level",
+        type=int,
+        choices=range(10),
+        default=None,
+        help="(optional) zlib compression level of the shapes, from 1"
+             " (fastest) to 9 (smallest), or 0 for no compression. Default"
+             " level of numpy if not set.",
+    )
+    parser.add_argument(
+        "--listing",
+        type=pathlib.Path,
+        default=None,
+        help="(optional) File listing the meshes of the input directory,"
+             " written on the first run and read on the next runs instead of"
+             " searching the directory again.",
+    )
+    parser.add_argument(
+        "--profile",
+        type=pathlib.Path,
+        default=None,
+        help="(optional) JSON Lines file where to write the durations of the"
+             " processing stages (loading, spatial index, neighbour queries,"
+             " point removal, texture rendering, saving), with their numbers"
+             " of vertices, faces and texels, per mesh and shape,"
+             " followed by their summary over all the workers.",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Generate all the shapes again, even if the output directory"
+             " holds shapes of a previous run, e.g. with different"
+             " parameters. By default, the shapes finished by the previous"
+             " runs are skipped, and a previous run with different parameters"
+             " is an error.",
+    )
 
 
 def _parse_args():
@@ -221,6 +1471,21 @@ def _parse_args():
     )
     parser_convert.add_argument("input", type=pathlib.Path)
     parser_convert.add_argument("output", type=pathlib.Path)
+    parser_convert.add_argument(
+        "--precision", type=int, default=None,
+        help="(optional) Number of significant digits of the float values"
+             " written to .obj files. By default, the shortest representation"
+             " that preserves the values is used.",
+    )
+    parser_convert.add_argument(
+        "--profile",
+        type=pathlib.Path,
+        default=None,
+        help="(optional) JSON Lines file where to write the durations of the"
+             " processing stages (loading, texture decoding, saving or"
+             " conversion to .npmap), with their numbers of vertices, faces"
+             " and texels, followed by their summary.",
+    )
     parser_convert.set_defaults(func=_do_convert)
 
     parser_shoot = subparsers.add_parser(
@@ -259,20 +1524,65 @@ def _parse_args():
              "hole."
              " (Supersedes --dropout and requires --min-dropout.)",
     )
+    _add_shape_arguments(parser_shoot)
     parser_shoot.add_argument(
-        "--seed",
-        type=int,
-        default=None,
-        help="Initial state for the pseudo random number generator."
-             " If not set, the initial state is not set explicitly.",
+        "--hole-metric",
+        choices=utils.HOLE_METRICS,
+        default="euclidean",
+        help="Metric of the neighbourhoods of the holes: 'euclidean' (nearest"
+             " points in space, default) or 'geodesic' (nearest points along"
+             " the edges of the mesh, so that the holes do not spread to"
+             " other nearby parts of the surface).",
     )
     parser_shoot.add_argument(
-        "--mask", type=pathlib.Path,
-        help=" (optional) Path to the mask (.npy) to generate holes only on"
-             " regions considered for evaluation.",
+        "--kdtree-cache-dir",
+        type=pathlib.Path,
+        default=None,
+        help="(optional) Directory where to cache the spatial index (KD-tree)"
+             " of each mesh, to reuse it across runs.",
     )
     parser_shoot.set_defaults(func=_do_shoot)
 
+    parser_slice = subparsers.add_parser(
+        "slice",
+        help="Generate partial data by slicing off parts of a mesh by random"
+             " planes.",
+    )
+    parser_slice.add_argument("input", type=pathlib.Path)
+    parser_slice.add_argument("output", type=pathlib.Path)
+    parser_slice.add_argument(
+        "--slices", type=int, default=2,
+        help="Number of slices to cut.",
+    )
+    parser_slice.add_argument(
+        "--min-slices", type=int, default=None,
+        help="Minimum number of slices to cut."
+             " (Supersedes --slices and requires --max-slices.)",
+    )
+    parser_slice.add_argument(
+        "--max-slices", type=int, default=None,
+        help="Maximum number of slices to cut."
+             " (Supersedes --slices and requires --min-slices.)",
+    )
+    parser_slice.add_argument(
+        "--dropout", type=float, default=1e-1,
+        help="Proportion of points of the mesh to remove in a single slice.",
+    )
+    parser_slice.add_argument(
+        "--min-dropout", type=float, default=None,
+        help="Minimum proportion of points of the mesh to remove in a single "
+             "slice."
+             " (Supersedes --dropout and requires --max-dropout.)",
+    )
+    parser_slice.add_argument(
+        "--max-dropout", type=float, default=None,
+        help="Maximum proportion of points of the mesh to remove in a single "
+             "slice."
+             " (Supersedes --dropout and requires --min-dropout.)",
+    )
+    _add_shape_arguments(parser_slice)
+    parser_slice.set_defaults(func=_do_slice)
+
     parser_shoot_dir = subparsers.add_parser(
         "shoot_dir",
         help="Generate partial data with the shooting method for a directory"
@@ -280,13 +1590,6 @@ def _parse_args():
     )
     parser_shoot_dir.add_argument("input_dir", type=pathlib.Path)
     parser_shoot_dir.add_argument("output_dir", type=pathlib.Path)
-    parser_shoot_dir.add_argument(
-        "--mask-dir",
-        type=pathlib.Path,
-        help=" (optional) Directory tree with the masks (.npy). If defined,"
-             " the partial data is created only on the non-masked faces of the"
-             " meshes. (Only valid for challenge 1.)",
-    )
     parser_shoot_dir.add_argument(
         "--holes",
         type=int,
@@ -299,31 +1602,129 @@ def _parse_args():
         default=2e-2,
         help="Proportion of points of the mesh to remove in a single hole.",
     )
+    _add_shape_dir_arguments(parser_shoot_dir)
     parser_shoot_dir.add_argument(
+        "--hole-metric",
+        choices=utils.HOLE_METRICS,
+        default="euclidean",
+        help="Metric of the neighbourhoods of the holes: 'euclidean' (nearest"
+             " points in space, default) or 'geodesic' (nearest points along"
+             " the edges of the mesh).",
+    )
+    parser_shoot_dir.add_argument(
+        "--kdtree-cache-dir",
+        type=pathlib.Path,
+        default=None,
+        help="(optional) Directory where to cache the spatial index (KD-tree)"
+             " of each mesh, to reuse it across runs. With --hole-metric"
+             " geodesic, the connectivity of the faces is cached too.",
+    )
+    parser_shoot_dir.set_defaults(func=_do_shoot_dir, method="shoot")
+
+    parser_slice_dir = subparsers.add_parser(
+        "slice_dir",
+        help="Generate partial data by slicing off parts of the meshes of a"
+             " directory tree by random planes."
+    )
+    parser_slice_dir.add_argument("input_dir", type=pathlib.Path)
+    parser_slice_dir.add_argument("output_dir", type=pathlib.Path)
+    parser_slice_dir.add_argument(
+        "--slices",
+        type=int,
+        default=2,
+        help="Number of slices to cut.",
+    )
+    parser_slice_dir.add_argument(
+        "--dropout",
+        type=float,
+        default=1e-1,
+        help="Proportion of points of the mesh to remove in a single slice.",
+    )
+    _add_shape_dir_arguments(parser_slice_dir)
+    parser_slice_dir.set_defaults(func=_do_shoot_dir, method="slice",
+                                  hole_metric="euclidean",
+                                  kdtree_cache_dir=None)
+
+    parser_evaluate = subparsers.add_parser(
+        "evaluate",
+        help="Evaluate an estimated mesh against a reference mesh.",
+    )
+    parser_evaluate.add_argument("reference", type=pathlib.Path)
+    parser_evaluate.add_argument("estimate", type=pathlib.Path)
+    parser_evaluate.add_argument(
+        "--n-samples", type=int, default=evaluation.N_SAMPLES,
+        help="Number of points sampled on each surface.",
+    )
+    parser_evaluate.add_argument(
         "--seed",
         type=int,
         default=None,
         help="Initial state for the pseudo random number generator."
              " If not set, the initial state is not set explicitly.",
     )
-    parser_shoot_dir.add_argument(
-        "-n", "--n-shapes",
+    parser_evaluate.add_argument(
+        "--n-workers",
         type=int,
-        default=1,
-        help="Number of partial shapes to generate per mesh."
-             " If n = 1 (default), the shape is saved as"
-             " '<mesh_name>-partial.npz'."
-             " If n > 1, the shapes are saved as '<mesh_name>-partial-XY.npz'"
-             ", with XY as 00, 01, 02... (assuming n <= 99).",
+        default=None,
+        help="Number of parallel threads. By default, the number of"
+             " available processors.",
     )
-    parser_shoot_dir.add_argument(
+    parser_evaluate.add_argument(
+        "--output", type=pathlib.Path, default=None,
+        help="(optional) Path to the output .json file. By default, the"
+             " results are printed.",
+    )
+    parser_evaluate.set_defaults(func=_do_evaluate)
+
+    parser_evaluate_dir = subparsers.add_parser(
+        "evaluate_dir",
+        help="Evaluate the predictions of a directory tree of meshes.",
+    )
+    parser_evaluate_dir.add_argument("reference_dir", type=pathlib.Path)
+    parser_evaluate_dir.add_argument("prediction_dir", type=pathlib.Path)
+    parser_evaluate_dir.add_argument("output_dir", type=pathlib.Path)
+    parser_evaluate_dir.add_argument(
+        "--n-samples", type=int, default=evaluation.N_SAMPLES,
+        help="Number of points sampled on each surface.",
+    )
+    parser_evaluate_dir.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Initial state for the pseudo random number generator."
+             " Default is 0, so that the results are reproducible and can be"
+             " cached.",
+    )
+    parser_evaluate_dir.add_argument(
         "--n-workers",
         type=int,
         default=None,
         help="Number of parallel processes. By default, the number of"
              " available processors.",
     )
-    parser_shoot_dir.set_defaults(func=_do_shoot_dir)
+    parser_evaluate_dir.add_argument(
+        "--cache-dir",
+        type=pathlib.Path,
+        default=None,
+        help="(optional) Directory of the cache of the results of each pair"
+             " of meshes. Default is the subdirectory 'cache' of the output"
+             " directory.",
+    )
+    parser_evaluate_dir.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Evaluate all the pairs of meshes, without reading or writing"
+             " the cache of the results.",
+    )
+    parser_evaluate_dir.add_argument(
+        "--listing",
+        type=pathlib.Path,
+        default=None,
+        help="(optional) File listing the meshes of the reference directory,"
+             " written on the first run and read on the next runs instead of"
+             " searching the directory again.",
+    )
+    parser_evaluate_dir.set_defaults(func=_do_evaluate_dir)
 
     args = parser.parse_args()
 
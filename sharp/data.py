@@ -1,10 +1,17 @@
 import csv
+import functools
+import json
 import pathlib
 import re
+import zipfile
+from multiprocessing import shared_memory
 
 import cv2
 import numpy as np
 
+from . import profiling
+from . import topology
+
 
 def read_3d_landmarks(inpath):
     """Read the 3d landmarks locations and names.
@@ -46,9 +53,10 @@ def imread(path):
 def imwrite(path, img, dtype=np.uint8):
     """Save an RGB image to a file.
 
-    Expect float values into [0, 1].
+    Expect float values into [0, 1], or values already of type `dtype`.
     """
-    img = (img * np.iinfo(dtype).max).astype(dtype)
+    if img.dtype != dtype:
+        img = (img * np.iinfo(dtype).max).astype(dtype)
     # OpenCV expects BGR.
     img = img[..., ::-1]
     cv2.imwrite(str(path), img)
@@ -56,21 +64,101 @@ def imwrite(path, img, dtype=np.uint8):
 
 def load_mesh(path):
     if str(path).endswith(".obj"):
-        return load_obj(path)
+        load = load_obj
     elif str(path).endswith(".npz"):
-        return load_npz(path)
-    raise ValueError(f"unknown mesh format {path}")
+        load = load_npz
+    elif str(path).endswith(".npmap"):
+        load = load_npmap
+    else:
+        raise ValueError(f"unknown mesh format {path}")
+    with profiling.span("load_mesh") as span:
+        mesh = load(path)
+        span.count(vertices=_size(mesh.vertices), faces=_size(mesh.faces))
+    return mesh
+
 
+def save_mesh(path, mesh, **kwargs):
+    """Save a mesh in the format given by the extension of the path.
 
-def save_mesh(path, mesh):
+    Extra keyword arguments are passed to the saver of the format.
+    """
     if str(path).endswith(".obj"):
-        return save_obj(path, mesh)
+        save = save_obj
     elif str(path).endswith(".npz"):
-        return save_npz(path, mesh)
-    raise ValueError(f"unknown mesh format for {path}")
+        save = save_npz
+    elif str(path).endswith(".npmap"):
+        save = save_npmap
+    else:
+        raise ValueError(f"unknown mesh format for {path}")
+    with profiling.span(save.__name__) as span:
+        span.count(vertices=_size(mesh.vertices), faces=_size(mesh.faces))
+        return save(path, mesh, **kwargs)
+
+
+def _size(array):
+    return 0 if array is None else len(array)
+
+
+class _LazyAttribute:
+    """Attribute of a `Mesh` that can be loaded on first access.
+
+    The value is stored in the slot of the same name prefixed with an
+    underscore. A loader recorded with `Mesh.defer` is called on the first
+    access and its result replaces it.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.slot = "_" + name
+
+    def __get__(self, mesh, owner=None):
+        if mesh is None:
+            return self
+        loader = mesh._loaders.pop(self.name, None)
+        if loader is not None:
+            setattr(mesh, self.slot, loader())
+        return getattr(mesh, self.slot)
+
+    def __set__(self, mesh, value):
+        mesh._loaders.pop(self.name, None)
+        setattr(mesh, self.slot, value)
 
 
 class Mesh:
+    """A mesh with optional attributes.
+
+    The attributes can be loaded on demand: the loaders record how to fetch
+    them with `defer` and they are materialized on first access. This avoids,
+    e.g., decoding the texture of a mesh when only its geometry is used.
+
+    The connectivity of the faces is indexed on demand too, see `topology`.
+    """
+
+    _ATTRIBUTES = (
+        "path",
+        "vertices", "vertex_normals", "vertex_colors",
+        "faces", "face_normals", "faces_normal_indices",
+        "normals",
+        "texcoords", "texture_indices", "texture",
+        "material", "mask_faces",
+    )
+
+    __slots__ = (tuple("_" + name for name in _ATTRIBUTES)
+                 + ("_loaders", "_topology"))
+
+    path = _LazyAttribute()
+    vertices = _LazyAttribute()
+    vertex_normals = _LazyAttribute()
+    vertex_colors = _LazyAttribute()
+    faces = _LazyAttribute()
+    face_normals = _LazyAttribute()
+    faces_normal_indices = _LazyAttribute()
+    normals = _LazyAttribute()
+    texcoords = _LazyAttribute()
+    texture_indices = _LazyAttribute()
+    texture = _LazyAttribute()
+    material = _LazyAttribute()
+    mask_faces = _LazyAttribute()
 
     def __init__(self, path=None,
                  vertices=None, vertex_normals=None, vertex_colors=None,
@@ -78,6 +166,8 @@ class Mesh:
                  normals=None,
                  texcoords=None, texture_indices=None, texture=None,
                  material=None, mask_faces=None):
+        self._loaders = {}
+        self._topology = None
         self.path = path
         self.vertices = vertices
         self.vertex_normals = vertex_normals
@@ -92,12 +182,87 @@ class Mesh:
         self.material = material
         self.mask_faces = mask_faces
 
+    def defer(self, name, loader):
+        """Load an attribute on its first access.
+
+        Args:
+            name (str): Name of the attribute.
+            loader (callable): Function without arguments returning the value
+                of the attribute. For the mesh to be picklable, it must be
+                picklable too (e.g. a `functools.partial` of a module-level
+                function).
+        """
+        if name not in self._ATTRIBUTES:
+            raise AttributeError(f"unknown mesh attribute {name}")
+        self._loaders[name] = loader
+
+    def is_loaded(self, name):
+        """Whether an attribute is materialized (i.e. not pending loading)."""
+        return name not in self._loaders
+
+    @property
+    def topology(self):
+        """Connectivity of the faces, see `topology.Topology`.
+
+        The index is built on first access and kept until the faces (or the
+        number of vertices) are replaced. Modifying the array of the faces in
+        place does not invalidate it.
+        """
+        if self.faces is None:
+            raise ValueError("the mesh has no faces")
+        index = self._topology
+        if index is None or not index.describes(self.faces,
+                                                len(self.vertices)):
+            with profiling.span("build_topology",
+                                vertices=len(self.vertices),
+                                faces=len(self.faces)):
+                index = topology.Topology.from_mesh(self)
+            self._topology = index
+        return index
+
+    def has_topology(self):
+        """Whether the index of the connectivity is built and up to date."""
+        return (self._topology is not None
+                and self.faces is not None
+                and self._topology.describes(self.faces, len(self.vertices)))
+
+    def load_topology(self, path=None, save=True):
+        """Load the index of the connectivity stored next to the mesh file.
+
+        Args:
+            path: (optional) Path to the index. By default, next to the file
+                of the mesh (see `topology.topology_path`).
+            save: Whether to save the index, when it is missing or out of
+                date, after building it.
+
+        Returns:
+            The index, also kept as `topology`.
+        """
+        if path is None:
+            if self.path is None:
+                raise ValueError("the mesh has no path")
+            path = topology.topology_path(self.path)
+        path = pathlib.Path(path)
+        if path.exists():
+            with profiling.span("load_topology",
+                                vertices=len(self.vertices),
+                                faces=len(self.faces)):
+                index = topology.Topology.load(path, self.faces)
+            if index is not None and index.describes(self.faces,
+                                                     len(self.vertices)):
+                self._topology = index
+                return index
+        index = self.topology
+        if save:
+            index.save(path)
+        return index
+
     @staticmethod
     def load(path):
         return load_mesh(path)
 
-    def save(self, path):
-        save_mesh(path, self)
+    def save(self, path, **kwargs):
+        save_mesh(path, self, **kwargs)
 
 
 def _read_mtl(mtl_path):
@@ -114,6 +279,41 @@ def _read_mtl(mtl_path):
     return None
 
 
+def obj_files(path):
+    """List the files of an .obj mesh: itself, its material and texture.
+
+    The material libraries are read from the `mtllib` statements before the
+    first vertex. The missing files are omitted.
+    """
+    path = pathlib.Path(path)
+    files = [path]
+    with open(path) as f:
+        for line in f:
+            tokens = line.split(maxsplit=1)
+            if not tokens:
+                continue
+            if tokens[0] == "v":
+                break
+            if tokens[0] == "mtllib" and len(tokens) > 1:
+                mtl_path = path.parent / tokens[1].strip()
+                if not mtl_path.exists():
+                    continue
+                files.append(mtl_path)
+                texture_name = _read_mtl(mtl_path)
+                if texture_name is not None:
+                    texture_path = path.parent / texture_name
+                    if texture_path.exists():
+                        files.append(texture_path)
+    return files
+
+
+def mesh_files(path):
+    """List the files storing a mesh."""
+    if str(path).endswith(".obj"):
+        return obj_files(path)
+    return [pathlib.Path(path)]
+
+
 def _parse_faces(obj_faces):
     """Parse the OBJ encoding of the face attribute index buffers.
 
@@ -163,19 +363,33 @@ def _parse_faces(obj_faces):
     return faces, faces_texture, faces_normals
 
 
-def _complete_texcoords(texcoords, texture_indices):
+def _complete_texture_indices(texture_indices, n_texcoords):
     """Ensure all faces reference some texture coordinates.
 
-    Make untextured faces reference a new dummy texture coordinate.
-    The new texture coordinate is placed at `(u, v) = (0, 0)`, assuming no
-    texture exists there (i.e. black color).
+    Make untextured faces reference a new dummy texture coordinate, to be
+    appended after the `n_texcoords` existing ones (see `_load_texcoords`).
+
+    Returns:
+        texture_indices
+        has_dummy: Whether the dummy texture coordinate is referenced.
     """
     no_texcoords = texture_indices < 0
-    if np.any(no_texcoords):
+    has_dummy = bool(np.any(no_texcoords))
+    if has_dummy:
+        texture_indices[no_texcoords] = n_texcoords
+    return texture_indices, has_dummy
+
+
+def _load_texcoords(text, n_lines, has_dummy):
+    """Parse the OBJ texture coordinates.
+
+    The dummy texture coordinate is placed at `(u, v) = (0, 0)`, assuming no
+    texture exists there (i.e. black color).
+    """
+    texcoords = _parse_records(text, n_lines, n_columns=2)
+    if has_dummy:
         texcoords = np.append(texcoords, [[.0, .0]], axis=0)
-        new_index = len(texcoords) - 1
-        texture_indices[no_texcoords] = new_index
-    return texcoords, texture_indices
+    return texcoords
 
 
 def _load_texture(path):
@@ -186,85 +400,267 @@ def _save_texture(path, texture):
     imwrite(path, texture)
 
 
+# Record types of the OBJ lines parsed in bulk.
+_OBJ_OTHER = 0
+_OBJ_VERTEX = 1
+_OBJ_TEXCOORD = 2
+_OBJ_NORMAL = 3
+_OBJ_FACE = 4
+
+
+def _group_obj_records(buffer):
+    """Group the lines of an OBJ file by record type.
+
+    The lines are classified from their leading characters, after their
+    indentation, without splitting the buffer into Python strings. The values
+    of each numeric record type are gathered into a single contiguous buffer,
+    stripped of the record keyword, that can be parsed at once.
+
+    Parameters
+    ----------
+    buffer : bytes
+        The content of the OBJ file.
+
+    Returns
+    -------
+    groups : dict
+        (record_type, (text, n_lines)) pairs for the numeric record types.
+    others : list
+        The tokenized lines of the other records (e.g. `mtllib`, `usemtl`).
+    """
+    chars = np.frombuffer(buffer, dtype=np.uint8)
+    n_chars = len(chars)
+    if n_chars == 0:
+        return {}, []
+
+    newlines = np.flatnonzero(chars == ord("\n"))
+    starts = np.concatenate([[0], newlines + 1])
+    if starts[-1] >= n_chars:
+        starts = starts[:-1]
+    # The spans include the line terminator.
+    spans = np.diff(np.append(starts, n_chars))
+
+    def is_blank(c):
+        return (c == ord(" ")) | (c == ord("\t"))
+
+    # Skip the indentation of the (usually few) indented lines.
+    heads = starts.copy()
+    indented = np.flatnonzero(is_blank(chars[starts]))
+    while len(indented) > 0:
+        heads[indented] += 1
+        indented = indented[(heads[indented] < starts[indented]
+                             + spans[indented])]
+        indented = indented[is_blank(chars[heads[indented]])]
+    # The spans of the records, from their keyword.
+    record_spans = spans - (heads - starts)
+
+    def char_at(offset):
+        positions = np.minimum(heads + offset, n_chars - 1)
+        return np.where(record_spans > offset, chars[positions], 0)
+
+    c0, c1, c2 = char_at(0), char_at(1), char_at(2)
+    is_blank1 = is_blank(c1)
+    is_blank2 = is_blank(c2)
+
+    kinds = np.full(len(starts), _OBJ_OTHER, dtype=np.uint8)
+    kinds[(c0 == ord("v")) & is_blank1] = _OBJ_VERTEX
+    kinds[(c0 == ord("v")) & (c1 == ord("t")) & is_blank2] = _OBJ_TEXCOORD
+    kinds[(c0 == ord("v")) & (c1 == ord("n")) & is_blank2] = _OBJ_NORMAL
+    kinds[(c0 == ord("f")) & is_blank1] = _OBJ_FACE
+
+    # Tag each byte with the record type of its line, then untag the record
+    # keywords so that only the values remain in each group.
+    byte_kinds = np.repeat(kinds, spans)
+    keyword_1 = kinds != _OBJ_OTHER
+    keyword_2 = (kinds == _OBJ_TEXCOORD) | (kinds == _OBJ_NORMAL)
+    byte_kinds[heads[keyword_1]] = _OBJ_OTHER
+    byte_kinds[heads[keyword_2] + 1] = _OBJ_OTHER
+
+    groups = {}
+    for kind in (_OBJ_VERTEX, _OBJ_TEXCOORD, _OBJ_NORMAL, _OBJ_FACE):
+        n_lines = np.count_nonzero(kinds == kind)
+        if n_lines > 0:
+            text = chars[byte_kinds == kind].tobytes()
+            groups[kind] = (text, n_lines)
+
+    # Only the few non-numeric records of interest are tokenized one by one.
+    others = []
+    is_other = (kinds == _OBJ_OTHER) & ((c0 == ord("m")) | (c0 == ord("u")))
+    for start, span in zip(starts[is_other], spans[is_other]):
+        tokens = buffer[start:start + span].decode().split()
+        if tokens:
+            others.append(tokens)
+
+    return groups, others
+
+
+def _parse_records(text, n_lines, n_columns=None):
+    """Parse a group of numeric records into a 2d array (one row per line).
+
+    If `n_columns` is set, only the first `n_columns` values of each record are
+    kept. This allows records with optional trailing values (e.g. `vt u v w`).
+    The values are parsed at once when all the records have the same number of
+    values. Otherwise, they are parsed line by line if `n_columns` is set, and
+    an error is raised if not.
+    """
+    values = np.fromstring(text, dtype=float, sep=" ")
+    # Mixed record widths may still add up to a multiple of the line count.
+    if (len(values) % n_lines == 0
+            and np.all(_count_tokens_per_line(text)
+                       == len(values) // n_lines)):
+        values = values.reshape(n_lines, -1)
+        return values if n_columns is None else values[:, :n_columns]
+    if n_columns is None:
+        raise ValueError("inconsistent number of values in the OBJ records")
+    # The records have a varying number of values.
+    return np.array([line.split()[:n_columns] for line in text.splitlines()],
+                    dtype=float)
+
+
+def _count_tokens_per_line(text):
+    """Number of whitespace-separated tokens of each line of a buffer."""
+    chars = np.frombuffer(text, dtype=np.uint8)
+    # Whitespace and control characters.
+    is_space = chars <= ord(" ")
+    is_token_start = ~is_space
+    is_token_start[1:] &= is_space[:-1]
+    token_starts = np.flatnonzero(is_token_start)
+    line_ends = np.append(np.flatnonzero(chars == ord("\n")), len(chars))
+    if len(chars) > 0 and chars[-1] == ord("\n"):
+        line_ends = line_ends[:-1]
+    return np.diff(np.searchsorted(token_starts, line_ends), prepend=0)
+
+
+def _parse_faces_bulk(text, n_faces):
+    """Parse the OBJ face records in bulk.
+
+    Supports the face corner forms `v`, `v/t`, `v//n` and `v/t/n`. When all
+    the corners share the same form and all the faces have the same number of
+    corners, the index buffers are parsed at once. Otherwise, the parsing
+    falls back to `_parse_faces`.
+
+    Returns:
+        faces
+        faces_texture: None if the faces do not reference texture coordinates.
+        faces_normals: None if the faces do not reference normals.
+    """
+    first_corner = text.split(maxsplit=1)[0]
+    n_slashes_corner = first_corner.count(b"/")
+    has_texture = n_slashes_corner > 0 and b"//" not in first_corner
+    has_normals = n_slashes_corner == 2
+    n_fields = 1 + has_texture + has_normals
+
+    n_slashes = text.count(b"/")
+    n_double_slashes = text.count(b"//")
+    values = np.fromstring(
+        text.replace(b"//", b" ").replace(b"/", b" "),
+        dtype=np.int64,
+        sep=" ",
+    )
+    n_corners = len(values) // n_fields
+
+    is_uniform = (
+        len(values) == n_corners * n_fields
+        and n_corners % n_faces == 0
+        and n_slashes == n_corners * n_slashes_corner
+        and n_double_slashes == (n_corners
+                                 if has_normals and not has_texture
+                                 else 0)
+        # The totals match faces of mixed sizes too, e.g. 2 triangles and 2
+        # pentagons for 4 quads.
+        and np.all(_count_tokens_per_line(text)
+                   == n_corners // n_faces)
+    )
+    if not is_uniform:
+        obj_faces = [line.split() for line in text.decode().splitlines()]
+        faces, faces_texture, faces_normals = _parse_faces(obj_faces)
+        return (faces,
+                faces_texture if np.any(faces_texture >= 0) else None,
+                # Normals are kept only if all the faces reference some.
+                faces_normals if len(faces_normals) == len(faces) else None)
+
+    # Change to zero-based indexing.
+    values = values.reshape(n_faces, -1, n_fields) - 1
+    faces = values[..., 0]
+    faces_texture = values[..., 1] if has_texture else None
+    faces_normals = values[..., -1] if has_normals else None
+
+    return faces, faces_texture, faces_normals
+
+
 def load_obj(path):
+    """Load a mesh from a Wavefront OBJ file.
+
+    The whole file is read at once and each record type (`v`, `vt`, `vn`, `f`)
+    is parsed in bulk into numpy arrays.
+    """
     path = pathlib.Path(path)
 
-    vertices = []
-    vertex_colors = []
-    normals = []
-    faces = []
-    texcoords = []
+    with open(path, "rb") as f:
+        buffer = f.read()
+    groups, others = _group_obj_records(buffer)
+
     material_name = None
-    mtl_filename = None
     texture_filename = None
-    texture = None
-    with open(path) as f:
-        for line in f:
-            line = line.strip()
+    for tokens in others:
+        if tokens[0] in ('usemtl', 'usemat'):
+            material_name = tokens[1]
+        elif tokens[0] == 'mtllib':
+            if len(tokens) > 1:
+                mtl_filename = tokens[1]
+                mtl_path = path.parent / mtl_filename
+                texture_filename = _read_mtl(mtl_path)
+
+    vertices = _parse_records(*groups[_OBJ_VERTEX])
+    vertex_colors = vertices[:, 3:] if vertices.shape[1] == 6 else None
+    vertices = vertices[:, :3]
+
+    if _OBJ_FACE in groups:
+        faces, texture_indices, faces_normal_indices = _parse_faces_bulk(
+            *groups[_OBJ_FACE])
+    else:
+        faces = np.empty((0, 3), dtype=int)
+        texture_indices = None
+        faces_normal_indices = None
+
+    has_texcoords = _OBJ_TEXCOORD in groups
+    if has_texcoords:
+        texcoords_text, n_texcoords = groups[_OBJ_TEXCOORD]
+        if texture_indices is None:
+            texture_indices = -np.ones_like(faces)
+        texture_indices, has_dummy = _complete_texture_indices(
+            texture_indices, n_texcoords)
+    else:
+        texture_indices = None
 
-            if not line:
-                # blank line
-                continue
-            if line.startswith('#'):
-                # comment
-                continue
+    texture_path = None
+    if texture_filename is not None:
+        texture_path = path.parent / texture_filename
+        if not texture_path.exists():
+            texture_path = None
 
-            tokens = line.split()
-            if tokens[0] == 'v':
-                vertices.append([float(x) for x in tokens[1:]])
-            elif tokens[0] == 'vn':
-                normals.append([float(x) for x in tokens[1:]])
-            elif tokens[0] == 'f':
-                faces.append(tokens[1:])
-            elif tokens[0] == 'vt':
-                texcoords.append([float(tokens[1]), float(tokens[2])])
-            elif tokens[0] in ('usemtl', 'usemat'):
-                material_name = tokens[1]
-            elif tokens[0] == 'mtllib':
-                if len(tokens) > 1:
-                    mtl_filename = tokens[1]
-                    mtl_path = path.parent / mtl_filename
-                    texture_filename = _read_mtl(mtl_path)
-
-        vertices = np.array(vertices)
-        if vertices.shape[1] == 6:
-            vertex_colors = vertices[:, 3:]
-        vertices = vertices[:, :3]
-
-        faces, texture_indices, faces_normal_indices = _parse_faces(faces)
-
-        if texcoords:
-            texcoords = np.asarray(texcoords, dtype=float)
-            texture_indices = np.asarray(texture_indices, dtype=int)
-            texcoords, texture_indices = _complete_texcoords(texcoords,
-                                                             texture_indices)
-        else:
-            texture_indices = []
-
-        if normals:
-            normals = np.array(normals)
-
-        if texture_filename is not None:
-            texture_path = path.parent / texture_filename
-            if texture_path.exists():
-                texture = _load_texture(texture_path)
-
-        return Mesh(
-            path=path,
-            vertices=vertices,
-            vertex_colors=vertex_colors if len(vertex_colors) > 0 else None,
-            faces=faces,
-            faces_normal_indices=(faces_normal_indices
-                                  if len(faces_normal_indices) > 0
-                                  else None),
-            normals=normals if len(normals) > 0 else None,
-            texcoords=texcoords if len(texcoords) > 0 else None,
-            texture=texture,
-            texture_indices=(texture_indices
-                             if len(texture_indices) > 0
-                             else None),
-            material=material_name,
-        )
+    mesh = Mesh(
+        path=path,
+        vertices=vertices,
+        vertex_colors=vertex_colors,
+        faces=faces,
+        faces_normal_indices=faces_normal_indices,
+        texture_indices=texture_indices,
+        material=material_name,
+    )
+
+    # Parse or decode the other attributes only on demand.
+    if _OBJ_NORMAL in groups:
+        mesh.defer("normals",
+                   functools.partial(_parse_records, *groups[_OBJ_NORMAL]))
+    if has_texcoords:
+        mesh.defer("texcoords",
+                   functools.partial(_load_texcoords,
+                                     texcoords_text, n_texcoords, has_dummy))
+    if texture_path is not None:
+        mesh.defer("texture", functools.partial(_load_texture, texture_path))
+
+    return mesh
 
 
 def _save_mtl(path, texture_name=None):
@@ -291,7 +687,62 @@ Ns 1000
         mtl_file.write(content)
 
 
-def save_obj(path, mesh, save_texture=True):
+# Number of records formatted at once when writing an OBJ file.
+_OBJ_WRITE_CHUNK_SIZE = 2 ** 16
+
+
+def _float_format(precision=None):
+    """Printf-style format of the OBJ float values.
+
+    With `precision=None`, the shortest representation that round-trips is
+    used. Otherwise, the values are written with `precision` significant
+    digits.
+    """
+    return "%r" if precision is None else f"%.{precision}g"
+
+
+def _write_records(f, record_format, values):
+    """Write the rows of an array as OBJ records.
+
+    The records are formatted by chunks of rows, each into a single string, to
+    avoid one write call per record.
+
+    Parameters
+    ----------
+    f : file object
+        The opened text file.
+    record_format : str
+        Printf-style format of a single record (i.e. one row of `values`),
+        including the line terminator.
+    values : array (N, M)
+        The values of the records.
+    """
+    for start in range(0, len(values), _OBJ_WRITE_CHUNK_SIZE):
+        chunk = values[start:start + _OBJ_WRITE_CHUNK_SIZE]
+        f.write((record_format * len(chunk)) % tuple(chunk.ravel().tolist()))
+
+
+def _interleave_columns(*arrays):
+    n_rows = len(arrays[0])
+    return np.dstack(arrays).reshape(n_rows, -1)
+
+
+def save_obj(path, mesh, save_texture=True, precision=None):
+    """Save a mesh to a Wavefront OBJ file.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The path to the output .obj file. The material (.mtl) and texture
+        (.png) are saved next to it.
+    mesh : Mesh
+        The mesh to save.
+    save_texture : bool
+        Whether to save the texture image.
+    precision : int
+        (optional) Number of significant digits of the float values. By
+        default, the shortest representation that round-trips is used.
+    """
     path = pathlib.Path(path)
     out_dir = pathlib.Path(path).parent
     out_dir.mkdir(parents=True, exist_ok=True)
@@ -310,29 +761,32 @@ def save_obj(path, mesh, save_texture=True):
     mtlname = mtlpath.name
     _save_mtl(mtlpath, texture_name=texture_name)
 
+    float_format = _float_format(precision)
+
+    def record_format(keyword, n_values):
+        return " ".join([keyword] + [float_format] * n_values) + "\n"
+
+    # The normals referenced by the faces are loaded as `normals`.
+    normals = (mesh.normals
+               if mesh.normals is not None
+               else mesh.vertex_normals)
+
     # Write the obj file.
     with open(path, 'w') as f:
         f.write(f"mtllib {mtlname}\n")
         f.write("usemtl material_0\n")
 
         if mesh.vertex_colors is not None:
-            for vertex, color in zip(mesh.vertices, mesh.vertex_colors):
-                f.write("v {} {} {} {} {} {}\n".format(*vertex, *color))
+            vertices = np.hstack([mesh.vertices, mesh.vertex_colors])
+            _write_records(f, record_format("v", 6), vertices)
         else:
-            for vertex in mesh.vertices:
-                f.write("v {} {} {}\n".format(*vertex))
+            _write_records(f, record_format("v", 3), mesh.vertices)
 
-        if mesh.vertex_normals is not None:
-            for normal in mesh.vertex_normals:
-                f.write("vn {} {} {}\n".format(*normal))
+        if normals is not None:
+            _write_records(f, record_format("vn", 3), normals)
 
         if mesh.texcoords is not None:
-            for coords in mesh.texcoords:
-                f.write("vt {} {}\n".format(*coords))
-
-        def _interleave_columns(*arrays):
-            n_rows = len(arrays[0])
-            return np.dstack(arrays).reshape(n_rows, -1)
+            _write_records(f, record_format("vt", 2), mesh.texcoords)
 
         faces = mesh.faces + 1
         texture_indices = (mesh.texture_indices + 1
@@ -343,16 +797,21 @@ def save_obj(path, mesh, save_texture=True):
                           else None)
 
         if texture_indices is None and normal_indices is None:
-            for face in faces:
-                f.write("f {} {} {}".format(*face))
+            corner_format = "%d"
+            indices = faces
         elif normal_indices is None:
+            corner_format = "%d/%d"
             indices = _interleave_columns(faces, texture_indices)
-            for indices_ in indices:
-                f.write("f {}/{} {}/{} {}/{}\n".format(*indices_))
         elif texture_indices is None:
+            corner_format = "%d//%d"
             indices = _interleave_columns(faces, normal_indices)
-            for indices_ in indices:
-                f.write("f {}//{} {}//{} {}//{}\n".format(*indices_))
+        else:
+            corner_format = "%d/%d/%d"
+            indices = _interleave_columns(faces, texture_indices,
+                                          normal_indices)
+        n_corners = faces.shape[1]
+        face_format = " ".join(["f"] + [corner_format] * n_corners) + "\n"
+        _write_records(f, face_format, indices)
 
 
 def astype_or_none(array, type_):
@@ -361,32 +820,354 @@ def astype_or_none(array, type_):
     return array.astype(type_)
 
 
-def load_npz(path):
-    data = np.load(path)
+def texture_as_float(texture, dtype=float):
+    """Convert a texture to float values into [0, 1].
 
-    assert data.f.texture.dtype == np.uint8
-    texture = data.f.texture.astype(float) / 255
+    Textures of integer type (e.g. uint8, as stored in .npz and .npmap files)
+    are scaled by the maximum value of their type.
+    """
+    if np.issubdtype(texture.dtype, np.integer):
+        return texture.astype(dtype) / np.iinfo(texture.dtype).max
+    return texture.astype(dtype, copy=False)
 
-    return Mesh(
-        path=path,
-        vertices=data.f.vertices.astype(float),
-        faces=data.f.faces.astype(int),
-        texcoords=data.f.texcoords.astype(float),
-        texture_indices=data.f.texcoords_indices.astype(int),
-        texture=texture,
-    )
+
+def texture_as_uint8(texture):
+    """Convert a texture with float values into [0, 1] to uint8."""
+    if texture.dtype == np.uint8:
+        return texture
+    return (255 * texture).astype("uint8")
 
 
-def save_npz(path, mesh):
-    np.savez_compressed(
-        path,
+def _stored_arrays(mesh):
+    """Arrays of a mesh in their stored type (for .npz and .npmap files)."""
+    return dict(
         vertices=mesh.vertices.astype("float32"),
         faces=mesh.faces.astype("uint32"),
         texcoords=astype_or_none(mesh.texcoords, "float32"),
         texcoords_indices=astype_or_none(mesh.texture_indices, "uint32"),
-        texture=((255 * mesh.texture).astype("uint8")
+        texture=(texture_as_uint8(mesh.texture)
                  if mesh.texture is not None
                  else None),
         mask_faces=astype_or_none(mesh.mask_faces, "uint32"),
         vertex_colors=astype_or_none(mesh.vertex_colors, "float32"),
     )
+
+
+def _load_npz_array(path, name, dtype):
+    with np.load(path) as data:
+        return data[name].astype(dtype)
+
+
+def _load_npz_texture(path):
+    with profiling.span("decode_texture") as span:
+        with np.load(path) as data:
+            texture = data["texture"]
+        assert texture.dtype == np.uint8
+        span.count(texels=texture.shape[0] * texture.shape[1])
+        return texture.astype(float) / 255
+
+
+def load_npz(path):
+    """Load a mesh from a .npz file.
+
+    Only the vertices and faces are read immediately. The texture information
+    is read and decoded on first access.
+    """
+    with np.load(path) as data:
+        vertices = data["vertices"].astype(float)
+        faces = data["faces"].astype(int)
+
+    mesh = Mesh(path=path, vertices=vertices, faces=faces)
+    mesh.defer("texcoords",
+               functools.partial(_load_npz_array, path, "texcoords", float))
+    mesh.defer("texture_indices",
+               functools.partial(_load_npz_array, path, "texcoords_indices",
+                                 int))
+    mesh.defer("texture", functools.partial(_load_npz_texture, path))
+
+    return mesh
+
+
+def save_npz(path, mesh, compresslevel=None):
+    """Save a mesh to a .npz file.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        Path to the output file.
+    mesh : Mesh
+        The mesh.
+    compresslevel : int, optional
+        Level of the zlib compression of the arrays, from 1 (fastest) to 9
+        (smallest), or 0 to store them uncompressed. The default level of
+        `np.savez_compressed` if None.
+    """
+    arrays = _stored_arrays(mesh)
+    if compresslevel is None:
+        np.savez_compressed(path, **arrays)
+        return
+
+    # As `np.savez_compressed`, with the given compression.
+    if compresslevel == 0:
+        compression = zipfile.ZIP_STORED
+        compresslevel = None
+    else:
+        compression = zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(path, "w", compression=compression,
+                         compresslevel=compresslevel, allowZip64=True) as zf:
+        for name, array in arrays.items():
+            with zf.open(f"{name}.npy", "w", force_zip64=True) as f:
+                # Undefined arrays are saved as pickled None objects.
+                np.lib.format.write_array(f, np.asanyarray(array),
+                                          allow_pickle=True)
+
+
+# Signature and version of the .npmap format.
+_NPMAP_MAGIC = b"\x93NPMAP\x01\x00"
+# Alignment in bytes of the arrays inside a .npmap file.
+_NPMAP_ALIGNMENT = 64
+# Size in bytes of the field storing the length of the header.
+_NPMAP_HEADER_LENGTH_SIZE = 8
+
+
+def _align(offset, alignment=_NPMAP_ALIGNMENT):
+    return -(-offset // alignment) * alignment
+
+
+def _npmap_data_offset(header_length):
+    return _align(len(_NPMAP_MAGIC) + _NPMAP_HEADER_LENGTH_SIZE
+                  + header_length)
+
+
+def _layout_arrays(arrays):
+    """Lay out arrays one after the other, aligned on `_NPMAP_ALIGNMENT` bytes.
+
+    Returns
+    -------
+    entries : dict
+        (name, {"dtype", "shape", "offset"}) pairs.
+    size : int
+        Total size in bytes.
+    """
+    entries = {}
+    offset = 0
+    for name, array in arrays.items():
+        entries[name] = {
+            "dtype": array.dtype.str,
+            "shape": array.shape,
+            "offset": offset,
+        }
+        offset = _align(offset + array.nbytes)
+    return entries, offset
+
+
+def save_npmap_arrays(path, arrays):
+    """Save named arrays into an uncompressed .npmap file.
+
+    The file starts with a signature and a JSON header describing the arrays
+    (type, shape and offset), followed by the raw arrays, each aligned on
+    `_NPMAP_ALIGNMENT` bytes so that they can be memory-mapped.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        Path to the output file.
+    arrays : dict
+        (name, array) pairs. Arrays set to None are not saved.
+    """
+    arrays = {name: np.ascontiguousarray(array)
+              for name, array in arrays.items()
+              if array is not None}
+
+    entries, offset = _layout_arrays(arrays)
+    header = json.dumps({"arrays": entries}).encode()
+    data_offset = _npmap_data_offset(len(header))
+
+    with open(path, "wb") as f:
+        f.write(_NPMAP_MAGIC)
+        f.write(len(header).to_bytes(_NPMAP_HEADER_LENGTH_SIZE, "little"))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_offset + entries[name]["offset"])
+            f.write(array.data)
+        # Extend the file to the end of the last aligned array.
+        f.truncate(data_offset + offset)
+
+
+def load_npmap_arrays(path):
+    """Memory-map the arrays of a .npmap file.
+
+    The arrays are read-only views of the file with the stored types. Their
+    content is read from the disk (or the page cache) on access.
+
+    Returns
+    -------
+    arrays : dict
+        (name, array) pairs.
+    """
+    with open(path, "rb") as f:
+        magic = f.read(len(_NPMAP_MAGIC))
+        if magic != _NPMAP_MAGIC:
+            raise ValueError(f"not a .npmap file {path}")
+        header_length = int.from_bytes(f.read(_NPMAP_HEADER_LENGTH_SIZE),
+                                       "little")
+        header = json.loads(f.read(header_length))
+    data_offset = _npmap_data_offset(header_length)
+
+    arrays = {}
+    for name, entry in header["arrays"].items():
+        dtype = np.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        if np.prod(shape) == 0:
+            # Empty arrays cannot be memory-mapped.
+            arrays[name] = np.empty(shape, dtype=dtype)
+            continue
+        arrays[name] = np.memmap(path, dtype=dtype, mode="r",
+                                 offset=data_offset + entry["offset"],
+                                 shape=shape)
+    return arrays
+
+
+def load_npmap(path):
+    """Load a mesh from a .npmap file.
+
+    The arrays are memory-mapped and keep their stored types (e.g. float32
+    vertices, uint32 faces and uint8 texture). Use `texture_as_float` to get
+    the texture with float values.
+    """
+    arrays = load_npmap_arrays(path)
+    return Mesh(
+        path=path,
+        vertices=arrays.get("vertices"),
+        faces=arrays.get("faces"),
+        texcoords=arrays.get("texcoords"),
+        texture_indices=arrays.get("texcoords_indices"),
+        texture=arrays.get("texture"),
+        mask_faces=arrays.get("mask_faces"),
+        vertex_colors=arrays.get("vertex_colors"),
+    )
+
+
+def save_npmap(path, mesh):
+    save_npmap_arrays(path, _stored_arrays(mesh))
+
+
+def convert_npz_to_npmap(npz_path, npmap_path):
+    """Convert a .npz mesh to .npmap.
+
+    The arrays are copied with their stored types, without converting them to
+    a `Mesh`.
+    """
+    data = np.load(npz_path)
+    arrays = {}
+    for name in data.files:
+        try:
+            arrays[name] = data[name]
+        except ValueError:
+            # Undefined arrays are saved as pickled None objects in .npz.
+            continue
+    save_npmap_arrays(npmap_path, arrays)
+
+
+def share_arrays(arrays):
+    """Copy named arrays into a new block of shared memory.
+
+    The arrays are laid out as in .npmap files.
+
+    Parameters
+    ----------
+    arrays : dict
+        (name, array) pairs. Arrays set to None are not shared.
+
+    Returns
+    -------
+    shm : multiprocessing.shared_memory.SharedMemory
+        The block of shared memory. The caller owns it: it must `close` and
+        `unlink` it when the arrays are no longer needed.
+    layout : dict
+        Description of the arrays in the block, to attach to them with
+        `attach_arrays`.
+    """
+    arrays = {name: np.ascontiguousarray(array)
+              for name, array in arrays.items()
+              if array is not None}
+    layout, size = _layout_arrays(arrays)
+    # Blocks of shared memory cannot be empty.
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for name, array in arrays.items():
+        offset = layout[name]["offset"]
+        shm.buf[offset:offset + array.nbytes] = array.reshape(-1).view("u1")
+    return shm, layout
+
+
+def attach_arrays(name, layout):
+    """Attach to arrays shared with `share_arrays`, without copy.
+
+    Parameters
+    ----------
+    name : str
+        Name of the block of shared memory.
+    layout : dict
+        Description of the arrays, as returned by `share_arrays`.
+
+    Returns
+    -------
+    shm : multiprocessing.shared_memory.SharedMemory
+        The block of shared memory. It must be kept open while the arrays are
+        in use.
+    arrays : dict
+        (name, array) pairs. The arrays are read-only views of the block.
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    arrays = {}
+    for array_name, entry in layout.items():
+        dtype = np.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        if np.prod(shape) == 0:
+            arrays[array_name] = np.empty(shape, dtype=dtype)
+            continue
+        array = np.ndarray(shape, dtype=dtype, buffer=shm.buf,
+                           offset=entry["offset"])
+        array.flags.writeable = False
+        arrays[array_name] = array
+    return shm, arrays
+
+
+def share_mesh(mesh, **arrays):
+    """Copy the arrays of a mesh into shared memory.
+
+    The attributes pending loading are loaded first. Extra arrays (e.g. a mask
+    of the faces) can be shared in the same block, under names other than the
+    ones of the attributes of `Mesh`.
+
+    Returns
+    -------
+    The block of shared memory and the layout of the arrays, see
+    `share_arrays`.
+    """
+    for name in Mesh._ATTRIBUTES:
+        value = getattr(mesh, name)
+        if isinstance(value, np.ndarray):
+            if name in arrays:
+                raise ValueError(f"array {name} shadows a mesh attribute")
+            arrays[name] = value
+    return share_arrays(arrays)
+
+
+def attach_mesh(name, layout):
+    """Attach to a mesh shared with `share_mesh`, without copy.
+
+    Returns
+    -------
+    shm : multiprocessing.shared_memory.SharedMemory
+        The block of shared memory, see `attach_arrays`.
+    mesh : Mesh
+        The mesh, with read-only arrays.
+    arrays : dict
+        The extra arrays shared with the mesh.
+    """
+    shm, arrays = attach_arrays(name, layout)
+    attributes = {name: arrays.pop(name)
+                  for name in Mesh._ATTRIBUTES
+                  if name in arrays}
+    return shm, Mesh(**attributes), arrays
@@ -0,0 +1,607 @@
+"""Evaluation metrics of the challenges (see doc/evaluation.md)."""
+import concurrent.futures
+import hashlib
+import json
+import os
+import pathlib
+
+import numpy as np
+from scipy.spatial import cKDTree as KDTree
+
+from . import data
+from . import linalg
+from . import sampling
+from . import utils
+
+
+# Number of points processed in a batch.
+CHUNK_SIZE = 2 ** 16
+
+# Number of candidate triangles, by centroid distance, tested first per point.
+N_CANDIDATES = 16
+
+# Maximum number of candidate triangles per point before testing all the
+# triangles within the search radius.
+MAX_CANDIDATES = 512
+
+# Maximum number of (point, triangle) pairs processed at once.
+MAX_PAIRS = 2 ** 20
+
+# Number of points sampled on each surface by default.
+N_SAMPLES = 100000
+
+# Version of the metrics, part of the keys of the cached results. To be
+# incremented when the results of `evaluate` change.
+METRICS_VERSION = 1
+
+
+def _batch_dot(x, y):
+    """Dot product along the last axis."""
+    return np.einsum("...i,...i->...", x, y)
+
+
+def closest_points_on_triangles(points, a, b, c):
+    """Find the closest points on triangles.
+
+    Vectorized version of the method of Ericson (Real-Time Collision
+    Detection, 5.1.5): the closest point is found from the Voronoi region of
+    the triangle containing the point.
+
+    The projection of a point on the plane of a triangle lies inside the
+    triangle if the point is in the interior region. This is the hit test of
+    the hit-rates (see doc/evaluation.md), obtained from the same quantities.
+
+    Args:
+        points: (N, 3) array of points.
+        a, b, c: (N, 3) arrays of the corners of the triangles.
+
+    Returns:
+        closest: (N, 3) array of the closest points on the triangles.
+        barycentrics: (N, 3) array of the barycentric coordinates of the
+            closest points with respect to (a, b, c).
+        inside: (N,) boolean array, whether the projections of the points on
+            the planes of the triangles lie inside the triangles.
+    """
+    ab = b - a
+    ac = c - a
+    ap = points - a
+    bp = points - b
+    cp = points - c
+    d1 = _batch_dot(ab, ap)
+    d2 = _batch_dot(ac, ap)
+    d3 = _batch_dot(ab, bp)
+    d4 = _batch_dot(ac, bp)
+    d5 = _batch_dot(ab, cp)
+    d6 = _batch_dot(ac, cp)
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    # Unnormalized barycentric coordinates of the projections.
+    inside = (va >= 0) & (vb >= 0) & (vc >= 0) & (va + vb + vc > 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Inside the triangle.
+        denominator = va + vb + vc
+        v = vb / denominator
+        w = vc / denominator
+        barycentrics = np.stack([1 - v - w, v, w], axis=-1)
+
+        # The regions are tested in reverse order of precedence, so that the
+        # first matching region of Ericson's sequence is the one kept.
+        in_bc = (va <= 0) & (d4 - d3 >= 0) & (d5 - d6 >= 0)
+        w = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+        barycentrics[in_bc] = np.stack([np.zeros_like(w), 1 - w, w],
+                                       axis=-1)[in_bc]
+
+        in_ac = (vb <= 0) & (d2 >= 0) & (d6 <= 0)
+        w = d2 / (d2 - d6)
+        barycentrics[in_ac] = np.stack([1 - w, np.zeros_like(w), w],
+                                       axis=-1)[in_ac]
+
+        in_c = (d6 >= 0) & (d5 <= d6)
+        barycentrics[in_c] = (0, 0, 1)
+
+        in_ab = (vc <= 0) & (d1 >= 0) & (d3 <= 0)
+        v = d1 / (d1 - d3)
+        barycentrics[in_ab] = np.stack([1 - v, v, np.zeros_like(v)],
+                                       axis=-1)[in_ab]
+
+        in_b = (d3 >= 0) & (d4 <= d3)
+        barycentrics[in_b] = (0, 1, 0)
+
+        in_a = (d1 <= 0) & (d2 <= 0)
+        barycentrics[in_a] = (1, 0, 0)
+
+    # Degenerate (flat) triangles not caught by the regions above.
+    degenerate = ~np.isfinite(barycentrics).all(axis=-1)
+    barycentrics[degenerate] = (1, 0, 0)
+
+    closest = (barycentrics[:, 0, np.newaxis] * a
+               + barycentrics[:, 1, np.newaxis] * b
+               + barycentrics[:, 2, np.newaxis] * c)
+    return closest, barycentrics, inside
+
+
+def _map_threads(function, *iterables, workers=-1):
+    """Map a function over iterables with a pool of threads.
+
+    Args:
+        workers: Number of threads. -1 uses all the CPUs. With 1, the function
+            is called in the current thread.
+
+    Returns:
+        The list of results.
+    """
+    if workers == -1:
+        workers = os.cpu_count()
+    if workers == 1:
+        return list(map(function, *iterables))
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        return list(executor.map(function, *iterables))
+
+
+class _TriangleGroup:
+    """Triangles of similar sizes, indexed by their centroids."""
+
+    def __init__(self, triangles, centroids, radius):
+        self.triangles = triangles
+        self.kdtree = KDTree(centroids)
+        self.radius = radius
+
+
+class TriangleTree:
+    """Nearest triangle search on a triangle mesh.
+
+    The candidate triangles of a point are found with KD-trees over the
+    centroids of the triangles, and the exact point-to-triangle distances are
+    computed on them in vectorized batches.
+
+    Each triangle lies in a sphere centered on its centroid. The triangles are
+    grouped by the radius of their sphere, so that a few large triangles do
+    not slow down the search among the others. In each group, the candidates
+    of a point are visited by increasing distance of their centroids, by
+    rounds of `n_candidates` candidates, four times more at each round. The
+    exact distance is computed only to the candidates with their sphere nearer
+    than the nearest triangle found. A point is resolved in a group when the
+    spheres of the triangles not visited yet, of radius at most the largest
+    radius of the group, are farther than the nearest triangle found. After
+    `MAX_CANDIDATES` candidates, all the triangles of the group that may be
+    nearer are tested at once. The search is thus exact.
+    """
+
+    def __init__(self, vertices, faces, n_candidates=N_CANDIDATES):
+        self.vertices = np.asarray(vertices, dtype=float)
+        self.faces = np.asarray(faces)
+        if len(self.faces) == 0:
+            raise ValueError("no triangles to search")
+        corners = self.vertices[self.faces]
+        self.centroids = corners.mean(axis=1)
+        # Slightly enlarged to be robust to rounding errors.
+        self.radii = linalg.norm(corners - self.centroids[:, np.newaxis],
+                                 axis=-1).max(axis=1) * (1 + 1e-6)
+        self.n_candidates = n_candidates
+
+        # Groups of radii up to twice the median, and then by factors of 2,
+        # from the largest group to the smallest.
+        scale = 2 * np.median(self.radii)
+        with np.errstate(divide="ignore"):
+            levels = np.ceil(np.log2(self.radii / scale)) if scale > 0 else 0
+        levels = np.maximum(levels, 0).astype(int)
+        counts = np.bincount(levels)
+        self.groups = []
+        for level in np.argsort(counts)[::-1]:
+            if counts[level] == 0:
+                break
+            triangles = np.flatnonzero(levels == level)
+            self.groups.append(_TriangleGroup(
+                triangles,
+                self.centroids[triangles],
+                self.radii[triangles].max(),
+            ))
+
+    def _closest(self, points, triangles):
+        a, b, c = np.moveaxis(self.vertices[self.faces[triangles]], 1, 0)
+        closest, barycentrics, hits = closest_points_on_triangles(
+            points, a, b, c)
+        distances = linalg.norm(points - closest, axis=-1)
+        return distances, closest, barycentrics, hits
+
+    def _update(self, points, results, owners, candidates, centroid_distances):
+        """Test candidate triangles and update the nearest ones.
+
+        Args:
+            points: (N, 3) array of points.
+            results: Tuple of the distances, triangles, closest points,
+                barycentrics and hits of the nearest triangles found so far,
+                updated in place.
+            owners: (K,) array of indices of points.
+            candidates: (K,) array of candidate triangles of `points[owners]`.
+            centroid_distances: (K,) array of the distances of the points to
+                the centroids of the candidates.
+        """
+        distances, triangles, closest, barycentrics, hits = results
+
+        # The distance to a triangle is at most the distance to its centroid
+        # and at least the distance to its sphere.
+        upper_bounds = distances.copy()
+        np.minimum.at(upper_bounds, owners, centroid_distances)
+        tested = (centroid_distances - self.radii[candidates]
+                  <= upper_bounds[owners])
+        owners = owners[tested]
+        candidates = candidates[tested]
+
+        for start in range(0, len(owners), MAX_PAIRS):
+            batch_owners = owners[start:start + MAX_PAIRS]
+            batch_candidates = candidates[start:start + MAX_PAIRS]
+            new_distances, new_closest, new_barycentrics, new_hits = (
+                self._closest(points[batch_owners], batch_candidates))
+
+            # Nearest candidate of each point.
+            order = np.lexsort((new_distances, batch_owners))
+            sorted_owners = batch_owners[order]
+            first = order[np.r_[True,
+                                sorted_owners[1:] != sorted_owners[:-1]]]
+            first = first[new_distances[first]
+                          < distances[batch_owners[first]]]
+            nearer = batch_owners[first]
+            distances[nearer] = new_distances[first]
+            triangles[nearer] = batch_candidates[first]
+            closest[nearer] = new_closest[first]
+            barycentrics[nearer] = new_barycentrics[first]
+            hits[nearer] = new_hits[first]
+
+    def _search_group(self, group, points, results, workers):
+        """Update the nearest triangles of points with a group."""
+        distances = results[0]
+        n_triangles = len(group.triangles)
+
+        pending = np.arange(len(points))
+        n_candidates = self.n_candidates
+        n_tested = 0
+        while len(pending) > 0 and n_candidates <= MAX_CANDIDATES:
+            n_candidates = min(n_candidates, n_triangles)
+            # Bound the number of (point, candidate) pairs in memory.
+            batch_size = max(MAX_PAIRS // n_candidates, 1)
+            unresolved = []
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start:start + batch_size]
+                centroid_distances, candidates = group.kdtree.query(
+                    points[batch], k=n_candidates, workers=workers)
+                centroid_distances = centroid_distances.reshape(len(batch),
+                                                                -1)
+                candidates = group.triangles[
+                    candidates.reshape(len(batch), -1)]
+                if n_tested == 0:
+                    # The nearest centroid gives a tight bound on the
+                    # distance, to skip most of the other candidates.
+                    self._update(points, results, batch, candidates[:, 0],
+                                 centroid_distances[:, 0])
+                    first_untested = 1
+                else:
+                    first_untested = n_tested
+                # Skip the candidates tested in the previous rounds.
+                self._update(
+                    points, results,
+                    np.repeat(batch, n_candidates - first_untested),
+                    candidates[:, first_untested:].ravel(),
+                    centroid_distances[:, first_untested:].ravel(),
+                )
+                if n_candidates < n_triangles:
+                    # Points with possibly nearer triangles among the
+                    # non-candidates.
+                    unresolved.append(batch[
+                        distances[batch]
+                        > centroid_distances[:, -1] - group.radius])
+
+            if n_candidates == n_triangles:
+                return
+            pending = np.concatenate(unresolved)
+            n_tested = n_candidates
+            n_candidates *= 4
+
+        if len(pending) == 0:
+            return
+
+        # Test all the triangles that may be nearer, e.g. for points far from
+        # the surface, by batches of bounded numbers of pairs.
+        radii = distances[pending] + group.radius
+        lengths = group.kdtree.query_ball_point(points[pending], radii,
+                                                workers=workers,
+                                                return_length=True)
+        batch_indices = np.cumsum(lengths) // MAX_PAIRS
+        for batch_index in np.unique(batch_indices):
+            selected = batch_indices == batch_index
+            batch = pending[selected]
+            neighbourhoods = group.kdtree.query_ball_point(
+                points[batch], radii[selected], workers=workers)
+            owners = np.repeat(batch, lengths[selected])
+            candidates = group.triangles[
+                np.concatenate(neighbourhoods).astype(int)]
+            centroid_distances = linalg.norm(
+                points[owners] - self.centroids[candidates], axis=-1)
+            self._update(points, results, owners, candidates,
+                         centroid_distances)
+
+    def _query_chunk(self, points, workers):
+        n_points = len(points)
+        results = (
+            np.full(n_points, np.inf),
+            np.zeros(n_points, dtype=int),
+            np.zeros((n_points, 3)),
+            np.zeros((n_points, 3)),
+            np.zeros(n_points, dtype=bool),
+        )
+        for group in self.groups:
+            self._search_group(group, points, results, workers)
+        return results
+
+    def query(self, points, workers=-1, chunk_size=CHUNK_SIZE):
+        """Find the nearest triangles of points.
+
+        Args:
+            points: (N, 3) array of points.
+            workers: Number of threads processing batches of points in
+                parallel. -1 uses all the CPUs.
+            chunk_size: Number of points in a batch.
+
+        Returns:
+            distances: (N,) array of the distances to the nearest triangles.
+            triangles: (N,) array of the indices of the nearest triangles.
+            closest: (N, 3) array of the closest points on the triangles.
+            barycentrics: (N, 3) array of the barycentric coordinates of the
+                closest points in their triangles.
+            hits: (N,) boolean array, whether the projections of the points
+                on the planes of their nearest triangles lie inside them.
+        """
+        points = np.asarray(points, dtype=float)
+        chunks = [points[start:start + chunk_size]
+                  for start in range(0, len(points), chunk_size)]
+        if not chunks:
+            return (np.empty(0), np.empty(0, dtype=int),
+                    np.empty((0, 3)), np.empty((0, 3)),
+                    np.empty(0, dtype=bool))
+        results = _map_threads(self._query_chunk, chunks, [1] * len(chunks),
+                               workers=workers)
+        return tuple(np.concatenate(arrays) for arrays in zip(*results))
+
+
+def texture_atlas(mesh):
+    """Texture atlas of a mesh, if any.
+
+    Returns:
+        The tuple (texture, texcoords, texture_indices) of the mesh, or None
+        if the mesh is not textured.
+    """
+    atlas = (mesh.texture, mesh.texcoords, mesh.texture_indices)
+    if any(array is None for array in atlas):
+        return None
+    return atlas
+
+
+def directed_distances(source, target, n_samples=N_SAMPLES, seed=None,
+                       workers=-1, source_atlas=None, target_atlas=None):
+    """Distances and hits of points sampled on a source to a target surface.
+
+    The points are sampled and processed by chunks, in parallel.
+
+    Args:
+        source: `sampling.SurfaceSampler` of the source surface.
+        target: `TriangleTree` of the target surface.
+        n_samples: Number of points sampled on the source.
+        seed: Initial state of the sampling. See `sampling.chunk_seeds`.
+        workers: Number of threads processing chunks in parallel. -1 uses
+            all the CPUs.
+        source_atlas, target_atlas: (optional) Texture atlases of the source
+            and the target, as returned by `texture_atlas`. Both are required
+            for the texture distances.
+
+    Returns:
+        distances: (n_samples,) array of the distances of the points to the
+            target.
+        hits: (n_samples,) boolean array, whether the points hit the target.
+        texture_distances: (n_samples,) array of the distances between the
+            texture values at the points and at their closest points on the
+            target, or None without the texture atlases.
+    """
+    has_texture = source_atlas is not None and target_atlas is not None
+
+    def process(chunk):
+        n_points, chunk_seed = chunk
+        points, triangles, barycentrics = source.sample(
+            n_points, np.random.default_rng(chunk_seed))
+        (distances, target_triangles, _, target_barycentrics,
+         hits) = target.query(points, workers=1)
+        if not has_texture:
+            return distances, hits
+        values = sampling.sample_texture(*source_atlas, triangles,
+                                         barycentrics)
+        target_values = sampling.sample_texture(*target_atlas,
+                                                target_triangles,
+                                                target_barycentrics)
+        texture_distances = linalg.norm(values - target_values, axis=-1)
+        return distances, hits, texture_distances
+
+    chunks = sampling.chunk_seeds(n_samples, seed)
+    results = _map_threads(process, chunks, workers=workers)
+    if not results:
+        return (np.empty(0), np.empty(0, dtype=bool),
+                np.empty(0) if has_texture else None)
+    arrays = [np.concatenate(arrays) for arrays in zip(*results)]
+    if not has_texture:
+        arrays.append(None)
+    distances, hits, texture_distances = arrays
+    return distances, hits, texture_distances
+
+
+def area_score(area_reference, area_estimate):
+    """Similarity of the surface areas of the reference and the estimate.
+
+    Returns:
+        The area score, S_a, into [0, 1].
+    """
+    total = area_reference + area_estimate
+    if total <= 0:
+        return 0.
+    return 1 - abs(area_reference - area_estimate) / total
+
+
+def hit_rate(hits):
+    """Count the hits and misses of points.
+
+    Args:
+        hits: Boolean array, whether each point hits the target.
+
+    Returns:
+        n_hits: Number of hits.
+        n_misses: Number of misses.
+        rate: Hit-rate into [0, 1], `n_hits / (n_hits + n_misses)`.
+    """
+    n_hits = int(np.count_nonzero(hits))
+    n_misses = len(hits) - n_hits
+    rate = n_hits / len(hits) if len(hits) > 0 else 0.
+    return n_hits, n_misses, rate
+
+
+def evaluate(reference, estimate, n_samples=N_SAMPLES, seed=None,
+             workers=-1, texture=True):
+    """Compute the evaluation metrics between meshes.
+
+    The directed distances are averaged over the sampled points.
+
+    Args:
+        reference: The ground truth `data.Mesh`.
+        estimate: The estimated `data.Mesh`.
+        n_samples: Number of points sampled on each surface.
+        seed: Initial state of the sampling. See `sampling.chunk_seeds`.
+        workers: Number of threads. -1 uses all the CPUs.
+        texture: Whether to compute the texture distances.
+
+    Returns:
+        A dict with, from the estimate to the reference (suffix "ER") and
+        from the reference to the estimate (suffix "RE"):
+        - the shape distances, "d_ER_shape" and "d_RE_shape",
+        - the texture distances, "d_ER_tex" and "d_RE_tex", if `texture` is
+          set and both meshes are textured,
+        - the numbers of hits, "hits_ER" and "hits_RE",
+        - the numbers of misses, "misses_ER" and "misses_RE",
+        - the hit-rates, "h_ER" and "h_RE",
+        and the area score, "S_a".
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    seed_er, seed_re = seed.spawn(2)
+
+    sampler_reference = sampling.SurfaceSampler.from_mesh(reference)
+    sampler_estimate = sampling.SurfaceSampler.from_mesh(estimate)
+    tree_reference = TriangleTree(reference.vertices, reference.faces)
+    tree_estimate = TriangleTree(estimate.vertices, estimate.faces)
+
+    atlas_reference = texture_atlas(reference) if texture else None
+    atlas_estimate = texture_atlas(estimate) if texture else None
+
+    d_er, hits_er, d_er_tex = directed_distances(
+        sampler_estimate, tree_reference, n_samples, seed_er,
+        workers=workers,
+        source_atlas=atlas_estimate,
+        target_atlas=atlas_reference,
+    )
+    d_re, hits_re, d_re_tex = directed_distances(
+        sampler_reference, tree_estimate, n_samples, seed_re,
+        workers=workers,
+        source_atlas=atlas_reference,
+        target_atlas=atlas_estimate,
+    )
+    n_hits_er, n_misses_er, h_er = hit_rate(hits_er)
+    n_hits_re, n_misses_re, h_re = hit_rate(hits_re)
+    results = {
+        "d_ER_shape": float(d_er.mean()),
+        "d_RE_shape": float(d_re.mean()),
+        "hits_ER": n_hits_er,
+        "misses_ER": n_misses_er,
+        "h_ER": h_er,
+        "hits_RE": n_hits_re,
+        "misses_RE": n_misses_re,
+        "h_RE": h_re,
+        "S_a": float(area_score(sampler_reference.area,
+                                sampler_estimate.area)),
+    }
+    if d_er_tex is not None:
+        results["d_ER_tex"] = float(d_er_tex.mean())
+        results["d_RE_tex"] = float(d_re_tex.mean())
+    return results
+
+
+def evaluate_paths(reference_path, estimate_path, **kwargs):
+    """Evaluate the meshes at the given paths. See `evaluate`."""
+    reference = data.load_mesh(reference_path)
+    estimate = data.load_mesh(estimate_path)
+    return evaluate(reference, estimate, **kwargs)
+
+
+def hash_mesh_files(path):
+    """Hash of the content of the files of a mesh (see `data.mesh_files`)."""
+    hash_ = hashlib.blake2b(digest_size=16)
+    for file_path in data.mesh_files(path):
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(2 ** 20), b""):
+                hash_.update(block)
+    return hash_.hexdigest()
+
+
+def _write_json(path, content):
+    """Write a .json file atomically, see `utils.atomic_write`."""
+    with utils.atomic_write(path, "w") as f:
+        json.dump(content, f)
+
+
+def evaluate_paths_cached(reference_path, estimate_path, cache_dir=None,
+                          n_samples=N_SAMPLES, seed=None, workers=-1,
+                          texture=True):
+    """Evaluate the meshes at the given paths, with a cache of the results.
+
+    The results are cached in `cache_dir`, keyed by the content of the files
+    of the two meshes and the parameters of the metrics. The sampling is
+    seeded with `seed` and the content of the reference, so that the results
+    do not depend on the location of the files.
+
+    Args:
+        cache_dir: (optional) Directory of the cache. If not set, the results
+            are not cached.
+        seed: Initial state of the sampling, an int or None (random initial
+            state, the results are then not cached).
+        Others: See `evaluate`.
+
+    Returns:
+        The results of `evaluate`.
+    """
+    reference_hash = hash_mesh_files(reference_path)
+    estimate_hash = hash_mesh_files(estimate_path)
+    pair_seed = np.random.SeedSequence(
+        None if seed is None else [seed, int(reference_hash, 16)])
+
+    use_cache = cache_dir is not None and seed is not None
+    if use_cache:
+        parameters = dict(
+            version=METRICS_VERSION,
+            reference=reference_hash,
+            estimate=estimate_hash,
+            n_samples=n_samples,
+            seed=seed,
+            texture=texture,
+        )
+        key = hashlib.blake2b(json.dumps(parameters, sort_keys=True).encode(),
+                              digest_size=16).hexdigest()
+        cache_path = pathlib.Path(cache_dir) / f"{key}.json"
+        if cache_path.exists():
+            with open(cache_path) as f:
+                return json.load(f)
+
+    results = evaluate_paths(reference_path, estimate_path,
+                             n_samples=n_samples, seed=pair_seed,
+                             workers=workers, texture=texture)
+
+    if use_cache:
+        _write_json(cache_path, results)
+
+    return results
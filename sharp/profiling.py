@@ -0,0 +1,175 @@
+"""Lightweight timing instrumentation of the processing stages.
+
+The stages are wrapped in named timing spans, with counters (e.g. numbers of
+vertices, faces or texels):
+
+    with profiling.span("load_mesh") as span:
+        mesh = load(path)
+        span.count(vertices=len(mesh.vertices))
+
+The spans are recorded only when profiling is enabled with `enable`.
+Otherwise, `span` and `labels` return a shared no-op object, at the cost of a
+function call.
+
+The spans are recorded per process, and forked processes start without the
+spans of their parent. Worker processes send theirs to the main process with
+`collect`.
+"""
+import collections
+import contextlib
+import os
+import threading
+import time
+
+
+_enabled = False
+# Spans recorded by the process since the last `collect`.
+_records = []
+# Labels of the spans of each thread.
+_local = threading.local()
+
+
+def _forget_records():
+    global _records
+    _records = []
+
+
+# Forked processes start without the spans of their parent.
+os.register_at_fork(after_in_child=_forget_records)
+
+
+class _Span:
+    __slots__ = ("name", "counters", "start")
+
+    def __init__(self, name, counters):
+        self.name = name
+        self.counters = counters
+
+    def count(self, **counters):
+        """Set counters of the span."""
+        self.counters.update(counters)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.start
+        _records.append({
+            "span": self.name,
+            "duration": duration,
+            "pid": os.getpid(),
+            "labels": getattr(_local, "labels", {}),
+            # Counts, possibly numpy integers, as JSON serializable ints.
+            "counters": {name: int(value)
+                         for name, value in self.counters.items()},
+        })
+        return False
+
+
+class _NullSpan:
+    """No-op span and labels, when profiling is disabled."""
+
+    def count(self, **counters):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def enable():
+    """Enable the recording of the spans in the process."""
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def span(name, **counters):
+    """Time a block of code.
+
+    Args:
+        name: Name of the span, e.g. of the stage.
+        counters: Initial counters of the span. More can be set with the
+            `count` method of the returned span.
+
+    Returns:
+        A context manager recording the span on exit.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, counters)
+
+
+@contextlib.contextmanager
+def _labelled(labels):
+    previous = getattr(_local, "labels", {})
+    _local.labels = {**previous, **labels}
+    try:
+        yield
+    finally:
+        _local.labels = previous
+
+
+def labels(**labels):
+    """Label the spans recorded by the current thread in a block of code.
+
+    E.g. with the mesh and the shape being processed.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _labelled(labels)
+
+
+def collect():
+    """Take the spans recorded by the process since the last call.
+
+    Returns:
+        A list of records (dicts) with the name, duration in seconds, process
+        id, labels and counters of the spans.
+    """
+    global _records
+    records, _records = _records, []
+    return records
+
+
+def summarize(records):
+    """Aggregate spans by name.
+
+    Returns:
+        A list of records with, for each name of span, its count, total, mean
+        and maximum durations, and the totals of its counters.
+    """
+    groups = collections.defaultdict(list)
+    for record in records:
+        groups[record["span"]].append(record)
+
+    summaries = []
+    for name, group in groups.items():
+        durations = [record["duration"] for record in group]
+        counters = collections.Counter()
+        for record in group:
+            counters.update(record["counters"])
+        summaries.append({
+            "summary": name,
+            "count": len(group),
+            "total": sum(durations),
+            "mean": sum(durations) / len(durations),
+            "max": max(durations),
+            "counters": dict(counters),
+        })
+    summaries.sort(key=lambda summary: summary["total"], reverse=True)
+    return summaries
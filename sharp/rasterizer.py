@@ -0,0 +1,220 @@
+from typing import Tuple
+
+import numpy as np
+
+from . import data
+
+
+# Maximum number of (triangle, row) pairs processed at once.
+CHUNK_SIZE = 2 ** 20
+
+
+# Float values of the uint8 intensities, as converted for the OpenGL renderer.
+_UINT8_TO_FLOAT32 = (np.arange(256) / 255).astype("f4")
+
+
+def as_float32(texture):
+    """Convert a texture to float32 values into [0, 1].
+
+    The values are the same as the ones of the texture converted for the
+    OpenGL renderer.
+    """
+    if texture.dtype == np.uint8:
+        return _UINT8_TO_FLOAT32[texture]
+    return data.texture_as_float(texture).astype("f4")
+
+
+def _uv_triangles_spans(tex_coords, tri_indices, output_size, chunk_size):
+    """Generate the spans of pixels covered by texture-space triangles.
+
+    A pixel is covered by a triangle if its center lies inside it. For each
+    row of pixels in the bounding box of a triangle, the span of covered
+    pixels is computed from the intersections of the row with the edges of the
+    triangle, by chunks of `chunk_size` (triangle, row) pairs.
+
+    Yields:
+        rows: Rows of the spans, in image orientation (i.e. the first row is
+            at v = 1).
+        first: First column of the spans.
+        last: Last column of the spans (included).
+    """
+    width, height = output_size
+
+    # Corners in pixel units, with the origin at the bottom left corner.
+    corners = tex_coords[tri_indices] * (width, height)
+
+    # Range of the rows with their center inside the bounding box.
+    lower = np.ceil(corners[:, :, 1].min(axis=1) - .5).astype(np.int64)
+    upper = np.floor(corners[:, :, 1].max(axis=1) - .5).astype(np.int64)
+    lower = np.maximum(lower, 0)
+    upper = np.minimum(upper, height - 1)
+    counts = np.maximum(upper - lower + 1, 0)
+
+    valid = counts > 0
+    corners = corners[valid]
+    lower = lower[valid]
+    counts = counts[valid]
+
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    n_rows = ends[-1] if len(ends) > 0 else 0
+
+    for chunk_start in range(0, n_rows, chunk_size):
+        chunk_end = min(chunk_start + chunk_size, n_rows)
+        pairs = np.arange(chunk_start, chunk_end)
+        tri = np.searchsorted(ends, pairs, side="right")
+        y = lower[tri] + pairs - starts[tri]
+        center_y = y + .5
+
+        # Intersections of the row with the edges of the triangles.
+        span_min = np.full(len(pairs), np.inf)
+        span_max = np.full(len(pairs), -np.inf)
+        for i, j in ((0, 1), (1, 2), (2, 0)):
+            p = corners[tri, i]
+            q = corners[tri, j]
+            crosses = ((np.minimum(p[:, 1], q[:, 1]) <= center_y)
+                       & (center_y <= np.maximum(p[:, 1], q[:, 1]))
+                       & (p[:, 1] != q[:, 1]))
+            # The intersections with the edges not crossed, e.g. horizontal,
+            # are not finite and ignored.
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t = (center_y - p[:, 1]) / (q[:, 1] - p[:, 1])
+                x = p[:, 0] + t * (q[:, 0] - p[:, 0])
+            span_min = np.where(crosses, np.minimum(span_min, x), span_min)
+            span_max = np.where(crosses, np.maximum(span_max, x), span_max)
+
+        # Columns with their center inside the span.
+        first = np.maximum(np.ceil(span_min - .5), 0)
+        last = np.minimum(np.floor(span_max - .5), width - 1)
+        nonempty = first <= last
+
+        yield (height - 1 - y[nonempty],
+               first[nonempty].astype(np.int64),
+               last[nonempty].astype(np.int64))
+
+
+def uv_triangles_coverage(tex_coords, tri_indices, output_size,
+                          chunk_size=CHUNK_SIZE):
+    """Count the texture-space triangles covering each pixel.
+
+    The spans of covered pixels of all the triangles are accumulated at once
+    as +1/-1 steps along the rows.
+
+    Args:
+        tex_coords: (N, 2) array of texture coordinates in [0, 1].
+        tri_indices: (M, 3) array of indices into `tex_coords`.
+        output_size: (width, height) of the output.
+        chunk_size: Maximum number of (triangle, row) pairs processed at once.
+
+    Returns:
+        An int32 (height, width) array in image orientation, i.e. the first row
+        is at v = 1 (as the output of `UVTrianglesRenderer.render`).
+    """
+    width, height = output_size
+
+    # Positions of the steps of +1 at the start and -1 after the end of the
+    # spans, with an extra column for the spans ending at the last column.
+    span_starts = [np.empty(0, dtype=np.int64)]
+    span_ends = [np.empty(0, dtype=np.int64)]
+    for rows, first, last in _uv_triangles_spans(tex_coords, tri_indices,
+                                                 output_size, chunk_size):
+        row_offsets = rows * (width + 1)
+        span_starts.append(row_offsets + first)
+        span_ends.append(row_offsets + last + 1)
+
+    n_steps = height * (width + 1)
+    steps = np.bincount(np.concatenate(span_starts), minlength=n_steps)
+    steps -= np.bincount(np.concatenate(span_ends), minlength=n_steps)
+    coverage = np.cumsum(steps.reshape(height, width + 1), axis=1,
+                         dtype=np.int32)
+    return np.ascontiguousarray(coverage[:, :width])
+
+
+def rasterize_uv_triangles(tex_coords, tri_indices, output_size,
+                           chunk_size=CHUNK_SIZE):
+    """Rasterize texture-space triangles into a coverage mask.
+
+    See `uv_triangles_coverage`.
+
+    Returns:
+        A boolean (height, width) mask in image orientation.
+    """
+    return uv_triangles_coverage(tex_coords, tri_indices, output_size,
+                                 chunk_size) > 0
+
+
+def uv_triangles_pixels(tex_coords, tri_indices, output_size,
+                        chunk_size=CHUNK_SIZE):
+    """List the pixels covered by texture-space triangles.
+
+    Unlike `uv_triangles_coverage`, the cost is proportional to the area of the
+    triangles, not to the output size.
+
+    Returns:
+        The flat indices of the covered pixels into a (height, width) image in
+        image orientation, once per covering triangle.
+    """
+    width, _ = output_size
+    pixels = [np.empty(0, dtype=np.int64)]
+    for rows, first, last in _uv_triangles_spans(tex_coords, tri_indices,
+                                                 output_size, chunk_size):
+        lengths = last - first + 1
+        span_offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        columns = (np.repeat(first, lengths)
+                   + np.arange(lengths.sum()) - span_offsets)
+        pixels.append(np.repeat(rows * width, lengths) + columns)
+    return np.concatenate(pixels)
+
+
+class UVTrianglesRasterizer:
+    """Software (numpy) alternative to `UVTrianglesRenderer`.
+
+    It does not require an OpenGL context. For an output of the size of the
+    texture, the result is the same as the one of `UVTrianglesRenderer`, up
+    to the pixels with their center on the edges of the triangles. Otherwise,
+    the texture is sampled at the nearest texel instead of interpolated.
+    """
+
+    def __init__(self, output_size: Tuple[int, int]):
+        self.output_size = output_size
+
+    def render(
+        self,
+        tex_coords,
+        tri_indices,
+        texture,
+        flip_y: bool = True,
+    ):
+        """Render the texture-space triangles with the source texture.
+
+        Args:
+            tex_coords: (N, 2) array of texture coordinates.
+            tri_indices: (M, 3) array of indices into `tex_coords`.
+            texture: (H, W, 3) texture, either with float values into [0, 1]
+                or of integer type (e.g. uint8).
+            flip_y: Whether the first row of the texture is at v = 1.
+
+        Returns:
+            A float32 (height, width, 3) image.
+        """
+        width, height = self.output_size
+        mask = rasterize_uv_triangles(tex_coords, tri_indices,
+                                      self.output_size)
+
+        if not flip_y:
+            texture = np.flipud(texture)
+
+        texture_height, texture_width = texture.shape[:2]
+        if (texture_width, texture_height) == self.output_size:
+            # Each pixel samples the texel at its center.
+            result = as_float32(texture)
+            result *= mask[..., np.newaxis]
+            return result
+
+        # Sample the nearest texel of each covered pixel.
+        rows, cols = np.nonzero(mask)
+        texture_rows = ((rows + .5) * texture_height / height).astype(int)
+        texture_cols = ((cols + .5) * texture_width / width).astype(int)
+        result = np.zeros((height, width, 3), dtype="f4")
+        result[rows, cols] = as_float32(texture[texture_rows, texture_cols])
+        return result
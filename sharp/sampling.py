@@ -0,0 +1,187 @@
+"""Uniform sampling of points on the surface of meshes."""
+import numpy as np
+
+from . import linalg
+
+
+# Number of points sampled in a chunk.
+CHUNK_SIZE = 2 ** 16
+
+
+def triangle_areas(vertices, faces):
+    """Areas of the triangles of a mesh."""
+    a, b, c = np.moveaxis(vertices[faces], 1, 0)
+    return .5 * linalg.norm(np.cross(b - a, c - a), axis=-1)
+
+
+def interpolate(values, faces, triangles, barycentrics):
+    """Interpolate per-vertex values at points in triangles.
+
+    Args:
+        values: (N, D) array of values at the vertices.
+        faces: (M, 3) array of indices into `values`.
+        triangles: (K,) array of indices into `faces`.
+        barycentrics: (K, 3) array of the barycentric coordinates of the
+            points in their triangles.
+
+    Returns:
+        (K, D) array of interpolated values.
+    """
+    corners = np.take(values, np.take(faces, triangles, axis=0), axis=0)
+    return np.einsum("ki,kid->kd", barycentrics, corners)
+
+
+def sample_texture(texture, texcoords, texture_indices, triangles,
+                   barycentrics):
+    """Sample a texture atlas at points in triangles.
+
+    The texture coordinates of the points are interpolated in their triangles
+    and the texture is interpolated bilinearly, with the texels at the edges
+    extended outside. The four texels around each point are fetched in a
+    single gather, and only them are converted to float32.
+
+    Args:
+        texture: (H, W, C) or (H, W) texture, with the first row at v = 1,
+            either with float values into [0, 1] or of integer type (e.g.
+            uint8).
+        texcoords: (N, 2) array of texture coordinates.
+        texture_indices: (M, 3) array of indices into `texcoords` per
+            triangle.
+        triangles: (K,) array of indices into `texture_indices`.
+        barycentrics: (K, 3) array of the barycentric coordinates of the
+            points in their triangles.
+
+    Returns:
+        A float32 (K, C) array of the values into [0, 1].
+    """
+    height, width = texture.shape[:2]
+    texels = texture.reshape(height * width, -1)
+
+    uv = interpolate(texcoords, texture_indices, triangles, barycentrics)
+    # Continuous pixel coordinates, with the texel centers at integer values.
+    x = uv[:, 0].astype("f4")
+    x *= width
+    x -= .5
+    y = 1 - uv[:, 1].astype("f4")
+    y *= height
+    y -= .5
+    x0 = np.floor(x)
+    y0 = np.floor(y)
+    wx = (x - x0)[:, np.newaxis]
+    wy = (y - y0)[:, np.newaxis]
+    x0 = x0.astype(np.int64)
+    y0 = y0.astype(np.int64)
+    x1 = np.clip(x0 + 1, 0, width - 1)
+    y1 = np.clip(y0 + 1, 0, height - 1)
+    np.clip(x0, 0, width - 1, out=x0)
+    np.clip(y0, 0, height - 1, out=y0)
+    y0 *= width
+    y1 *= width
+
+    # Texels at (y0, x0), (y0, x1), (y1, x0), (y1, x1).
+    indices = np.stack([y0 + x0, y0 + x1, y1 + x0, y1 + x1], axis=-1)
+    corners = np.take(texels, indices, axis=0).astype("f4")
+
+    top = corners[:, 1] - corners[:, 0]
+    top *= wx
+    top += corners[:, 0]
+    bottom = corners[:, 3] - corners[:, 2]
+    bottom *= wx
+    bottom += corners[:, 2]
+    values = bottom - top
+    values *= wy
+    values += top
+    if np.issubdtype(texture.dtype, np.integer):
+        values *= np.float32(1 / np.iinfo(texture.dtype).max)
+    return values
+
+
+def chunk_seeds(n_points, seed=None, chunk_size=CHUNK_SIZE):
+    """Split the sampling of points into chunks with independent seeds.
+
+    The samples of a chunk only depend on its seed. The chunks can thus be
+    sampled in any order, e.g. in parallel, with reproducible results for a
+    given `seed` and `chunk_size`.
+
+    Args:
+        n_points: Total number of points.
+        seed: Initial state of the sampling, an int, a
+            `np.random.SeedSequence` or None (random initial state).
+        chunk_size: Maximum number of points in a chunk.
+
+    Returns:
+        A list of (number of points, `np.random.SeedSequence`) per chunk.
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    sizes = [min(chunk_size, n_points - start)
+             for start in range(0, n_points, chunk_size)]
+    return list(zip(sizes, seed.spawn(len(sizes))))
+
+
+class SurfaceSampler:
+    """Sample points uniformly on the surface of a mesh.
+
+    The triangles are drawn in proportion to their area, by inverting the
+    cumulative areas with `np.searchsorted`, and the points uniformly inside
+    the triangles.
+    """
+
+    def __init__(self, vertices, faces):
+        self.vertices = vertices
+        self.faces = faces
+        self.areas = triangle_areas(vertices, faces)
+        self.cumulative_areas = np.cumsum(self.areas)
+        self.area = (self.cumulative_areas[-1]
+                     if len(self.cumulative_areas) > 0
+                     else 0.)
+
+    @classmethod
+    def from_mesh(cls, mesh):
+        return cls(mesh.vertices, mesh.faces)
+
+    def sample(self, n_points, rng=None):
+        """Sample points on the surface.
+
+        Args:
+            n_points: Number of points.
+            rng: Pseudo-random number generator.
+
+        Returns:
+            points: (n_points, 3) array of points.
+            triangles: (n_points,) array of the indices of the triangles of
+                the points.
+            barycentrics: (n_points, 3) array of the barycentric coordinates
+                of the points in their triangles.
+        """
+        if self.area <= 0:
+            raise ValueError("cannot sample a surface of null area")
+        rng = np.random.default_rng() if rng is None else rng
+
+        triangles = np.searchsorted(self.cumulative_areas,
+                                    rng.random(n_points) * self.area,
+                                    side="right")
+        # Guard against rounding errors at the end of the cumulative areas.
+        np.minimum(triangles, len(self.areas) - 1, out=triangles)
+
+        barycentrics = np.empty((n_points, 3))
+        barycentrics[:, 1:] = rng.random((n_points, 2))
+        # Fold the samples of the parallelogram back into the triangle.
+        outside = barycentrics[:, 1] + barycentrics[:, 2] > 1
+        barycentrics[outside, 1:] = 1 - barycentrics[outside, 1:]
+        barycentrics[:, 0] = 1 - barycentrics[:, 1] - barycentrics[:, 2]
+
+        points = interpolate(self.vertices, self.faces, triangles,
+                             barycentrics)
+        return points, triangles, barycentrics
+
+    def sample_chunks(self, n_points, seed=None, chunk_size=CHUNK_SIZE):
+        """Sample points on the surface by chunks.
+
+        See `chunk_seeds` for the seeding of the chunks.
+
+        Yields:
+            The samples of each chunk, as returned by `sample`.
+        """
+        for size, chunk_seed in chunk_seeds(n_points, seed, chunk_size):
+            yield self.sample(size, np.random.default_rng(chunk_seed))
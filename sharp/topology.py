@@ -0,0 +1,192 @@
+"""Connectivity of triangle meshes in compressed sparse row (CSR) arrays."""
+import hashlib
+import pathlib
+
+import numpy as np
+
+from . import utils
+
+
+# Version of the format of the files of `Topology.save`.
+FORMAT_VERSION = 1
+
+
+def _csr(rows, values, n_rows):
+    """Group values by row.
+
+    Returns:
+        indptr: (n_rows + 1,) array. The values of row i are
+            `values[indptr[i]:indptr[i + 1]]`.
+        values: The values sorted by row (stable).
+    """
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return indptr, values[order]
+
+
+def hash_faces(faces):
+    """Hash of the content of an array of faces."""
+    faces = np.ascontiguousarray(faces, dtype=np.int64)
+    hash_ = hashlib.blake2b(digest_size=16)
+    hash_.update(str(faces.shape).encode())
+    hash_.update(faces.data)
+    return hash_.hexdigest()
+
+
+class Topology:
+    """Connectivity of a triangle mesh.
+
+    The faces around each vertex and the neighbours of each vertex are stored
+    in CSR arrays: e.g. the faces around vertex v are
+    `vertex_faces[vertex_faces_indptr[v]:vertex_faces_indptr[v + 1]]` (see
+    `faces_of`), so that they are found in constant time. The index is built
+    at once with `np.argsort` and `np.bincount`.
+
+    Attributes:
+        n_vertices: Number of vertices.
+        vertex_faces_indptr, vertex_faces: Faces around each vertex, by
+            increasing index.
+        neighbours_indptr, neighbours: Vertices sharing an edge with each
+            vertex, by increasing index.
+        edges: (E, 2) array of the unique edges, as (lower, upper) vertex
+            indices sorted lexicographically.
+        edge_face_counts: (E,) array of the number of faces of each edge.
+    """
+
+    def __init__(self, faces, n_vertices):
+        faces = np.asarray(faces)
+        self.n_vertices = n_vertices
+        # The faces the index was built from, to check that it is up to date.
+        self._faces = faces
+
+        n_faces = len(faces)
+        self.vertex_faces_indptr, self.vertex_faces = _csr(
+            faces.ravel(), np.repeat(np.arange(n_faces), 3), n_vertices)
+
+        edges = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]],
+                                faces[:, [2, 0]]]).astype(np.int64)
+        edges.sort(axis=1)
+        keys, counts = np.unique(edges[:, 0] * n_vertices + edges[:, 1],
+                                 return_counts=True)
+        lower, upper = np.divmod(keys, n_vertices)
+        self.edges = np.stack([lower, upper], axis=1)
+        self.edge_face_counts = counts
+
+        # Both directions of the edges, sorted by (vertex, neighbour).
+        sources = np.concatenate([lower, upper])
+        targets = np.concatenate([upper, lower])
+        order = np.argsort(targets, kind="stable")
+        self.neighbours_indptr, self.neighbours = _csr(
+            sources[order], targets[order], n_vertices)
+
+    @classmethod
+    def from_mesh(cls, mesh):
+        return cls(mesh.faces, len(mesh.vertices))
+
+    def describes(self, faces, n_vertices):
+        """Whether the index is the one of the given faces.
+
+        The faces are compared by identity: an index is invalidated by
+        replacing the array of the faces, not by modifying it in place.
+        """
+        return self._faces is faces and self.n_vertices == n_vertices
+
+    @property
+    def boundary_edges(self):
+        """(B, 2) array of the edges of a single face."""
+        return self.edges[self.edge_face_counts == 1]
+
+    def faces_of(self, vertex):
+        """Indices of the faces around a vertex."""
+        return self.vertex_faces[self.vertex_faces_indptr[vertex]:
+                                 self.vertex_faces_indptr[vertex + 1]]
+
+    def neighbours_of(self, vertex):
+        """Indices of the vertices sharing an edge with a vertex."""
+        return self.neighbours[self.neighbours_indptr[vertex]:
+                               self.neighbours_indptr[vertex + 1]]
+
+    def _faces_around(self, vertices):
+        """Faces around each of several vertices, with repetitions."""
+        vertices = np.asarray(vertices, dtype=np.int64)
+        starts = self.vertex_faces_indptr[vertices]
+        counts = self.vertex_faces_indptr[vertices + 1] - starts
+        # Positions into `vertex_faces` of the ranges of all the vertices.
+        offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        positions = np.arange(counts.sum()) + offsets
+        return self.vertex_faces[positions]
+
+    def faces_of_vertices(self, vertices):
+        """Indices of the faces around any of several vertices.
+
+        The cost is proportional to the number of faces around the vertices,
+        not to the size of the mesh.
+
+        Returns:
+            The unique indices of the faces, sorted.
+        """
+        return np.unique(self._faces_around(vertices))
+
+    def faces_mask(self, vertices):
+        """Boolean mask of the faces around any of several vertices."""
+        mask = np.zeros(len(self.vertex_faces) // 3, dtype=bool)
+        mask[self._faces_around(vertices)] = True
+        return mask
+
+    def edge_lengths(self, vertices):
+        """Lengths of the edges (see `edges`) for vertices positions."""
+        return np.linalg.norm(vertices[self.edges[:, 1]]
+                              - vertices[self.edges[:, 0]], axis=1)
+
+    def save(self, path):
+        """Save the index to a .npz file, with the hash of its faces.
+
+        The file is written atomically, see `utils.atomic_write`.
+        """
+        with utils.atomic_write(path) as f:
+            np.savez(f,
+                     version=FORMAT_VERSION,
+                     n_vertices=self.n_vertices,
+                     faces_hash=hash_faces(self._faces),
+                     vertex_faces_indptr=self.vertex_faces_indptr,
+                     vertex_faces=self.vertex_faces,
+                     neighbours_indptr=self.neighbours_indptr,
+                     neighbours=self.neighbours,
+                     edges=self.edges,
+                     edge_face_counts=self.edge_face_counts)
+
+    @classmethod
+    def load(cls, path, faces):
+        """Load an index saved with `save`.
+
+        Args:
+            path: Path to the file.
+            faces: The faces of the mesh, checked against the hash of the
+                faces of the saved index.
+
+        Returns:
+            The index, or None if it was saved for other faces or in another
+            format.
+        """
+        with np.load(path) as arrays:
+            if (arrays["version"] != FORMAT_VERSION
+                    or str(arrays["faces_hash"]) != hash_faces(faces)):
+                return None
+            topology = cls.__new__(cls)
+            topology.n_vertices = int(arrays["n_vertices"])
+            topology._faces = faces
+            for name in ("vertex_faces_indptr", "vertex_faces",
+                         "neighbours_indptr", "neighbours", "edges",
+                         "edge_face_counts"):
+                setattr(topology, name, arrays[name])
+        return topology
+
+
+def topology_path(mesh_path):
+    """Path to the index of a mesh stored next to it, see `Mesh.load_topology`.
+
+    E.g. "path/to/mesh.topology.npz" for "path/to/mesh.obj".
+    """
+    mesh_path = pathlib.Path(mesh_path)
+    return mesh_path.with_name(mesh_path.stem + ".topology.npz")
@@ -32,6 +32,18 @@ void main() {
 """
 
 
+def create_standalone_ctx() -> MGL.Context:
+    """Create a standalone OpenGL context.
+
+    Fall back to the EGL backend when the default one is unavailable, e.g. on
+    headless machines without a display.
+    """
+    try:
+        return MGL.create_standalone_context(require=330)
+    except Exception:
+        return MGL.create_standalone_context(require=330, backend="egl")
+
+
 class UVTrianglesRenderer:
     def __init__(self, ctx: MGL.Context, output_size: Tuple[int, int]):
         self.ctx = ctx
@@ -43,28 +55,47 @@ class UVTrianglesRenderer:
             self.ctx.renderbuffer(self.output_size, dtype="f4")
         )
         self.background_color = (0, 0, 0)
+        self._texture_object = None
+        self._texture_source = None
 
     def __del__(self):
-        self.ctx.release()
+        self.release_texture()
         self.fbo.release()
         self.shader.release()
+        self.ctx.release()
 
     @staticmethod
     def with_standalone_ctx(output_size: Tuple[int, int]) -> "UVTrianglesRenderer":
-        return UVTrianglesRenderer(
-            MGL.create_standalone_context(require=330), output_size
-        )
+        return UVTrianglesRenderer(create_standalone_ctx(), output_size)
 
     @staticmethod
     def with_window_ctx(output_size: Tuple[int, int]) -> "UVTrianglesRenderer":
         return UVTrianglesRenderer(MGL.create_context(require=330), output_size)
 
-    def _init_ctx_object(self, tex_coords, tri_indices, texture):
-        resources = []
-        tex_coords_buffer = self.ctx.buffer(tex_coords.astype("f4").tobytes())
-        resources.append(tex_coords_buffer)
-        tri_indices_buffer = self.ctx.buffer(tri_indices.astype("i4").tobytes())
-        resources.append(tri_indices_buffer)
+    def set_texture(
+        self,
+        texture: NDArray[(Any, Any, 3), float],
+        flip_y: bool = True,
+        source: Any = None,
+    ):
+        """Upload the source texture for the subsequent renderings.
+
+        The texture stays on the GPU until it is replaced or released.
+
+        Args:
+            texture: The source texture.
+            flip_y: Whether to flip the texture vertically.
+            source: (optional) The object the texture was derived from (e.g.
+                the texture of a mesh before its conversion to float). It is
+                referenced until the texture is replaced, so that
+                `has_texture` can identify it.
+        """
+        assert isinstance(texture, NDArray[(Any, Any, 3), float])
+
+        if flip_y:
+            texture = np.flipud(texture)
+
+        self.release_texture()
 
         texture_height = texture.shape[0]
         texture_width = texture.shape[1]
@@ -73,18 +104,36 @@ class UVTrianglesRenderer:
         else:
             components = 1
 
-        texture_object = self.ctx.texture(
+        self._texture_object = self.ctx.texture(
             (texture_width, texture_height),
             components,
             texture.astype("f4").tobytes(),
             dtype="f4",
         )
+        self._texture_source = source
+
+    def has_texture(self, source: Any) -> bool:
+        """Whether the uploaded texture was derived from `source`."""
+        return (self._texture_object is not None
+                and source is not None
+                and self._texture_source is source)
 
-        resources.append(texture_object)
+    def release_texture(self):
+        if self._texture_object is not None:
+            self._texture_object.release()
+        self._texture_object = None
+        self._texture_source = None
+
+    def _init_ctx_object(self, tex_coords, tri_indices):
+        resources = []
+        tex_coords_buffer = self.ctx.buffer(tex_coords.astype("f4").tobytes())
+        resources.append(tex_coords_buffer)
+        tri_indices_buffer = self.ctx.buffer(tri_indices.astype("i4").tobytes())
+        resources.append(tri_indices_buffer)
 
         content = (tex_coords_buffer, "2f4", "point_uv")
         self.shader["texture_color"] = 0
-        texture_object.use(0)
+        self._texture_object.use(0)
         vao = self.ctx.vertex_array(self.shader, [content], tri_indices_buffer)
         resources.append(vao)
 
@@ -108,20 +157,26 @@ class UVTrianglesRenderer:
         self,
         tex_coords: NDArray[(Any, 2), float],
         tri_indices: NDArray[(Any, 3), int],
-        texture: NDArray[(Any, Any, 3), float],
+        texture: NDArray[(Any, Any, 3), float] = None,
         flip_y: bool = True,
     ) -> NDArray[(Any, Any, 3), float]:
+        """Render the texture-space triangles with the source texture.
+
+        If `texture` is None, the texture uploaded by the previous call (or by
+        `set_texture`) is used.
+        """
         assert isinstance(tex_coords, NDArray[(Any, 2), float])
         assert isinstance(tri_indices, NDArray[(Any, 3), int])
-        assert isinstance(texture, NDArray[(Any, Any, 3), float])
 
-        if flip_y:
-            texture = np.flipud(texture)
+        if texture is not None:
+            self.set_texture(texture, flip_y)
+        elif self._texture_object is None:
+            raise ValueError("no texture to render")
 
         resources = []
 
         try:
-            vao, resources = self._init_ctx_object(tex_coords, tri_indices, texture)
+            vao, resources = self._init_ctx_object(tex_coords, tri_indices)
             self._render(vao)
             result = self._get_fbo_image()
 
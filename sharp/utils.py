@@ -1,27 +1,130 @@
+import atexit
+import contextlib
 import copy
+import hashlib
 import numbers
+import os
+import pathlib
+import pickle
+import tempfile
 
 import cv2
 import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
 try:
     from scipy.spatial import cKDTree as KDTree
 except ImportError:
     from scipy.spatial import KDTree
 
 from . import data
+from . import profiling
+from . import rasterizer
+from . import topology
+from .rasterizer import UVTrianglesRasterizer
 from .trirender import UVTrianglesRenderer
 
 
+# Backends for rendering textures: OpenGL or software rasterization.
+RENDER_BACKENDS = ("gl", "cpu")
+# Metrics of the neighbourhoods of the holes: straight-line distance or
+# distance along the edges of the mesh.
+HOLE_METRICS = ("euclidean", "geodesic")
+
+
+def plane_distances(vertices, centers, normals):
+    """Signed distances of points to planes.
+
+    The distances to all the planes are computed at once, as a single matrix
+    product of the points and the normals.
+
+    Args:
+        vertices: (N, 3) array of points.
+        centers: (P, 3) array of points on the planes.
+        normals: (P, 3) array of normals to the planes.
+
+    Returns:
+        (N, P) array of the distances, in units of the norms of the normals,
+        positive on the side of the normals.
+    """
+    normals = np.asarray(normals, dtype=float)
+    offsets = np.einsum("pi,pi->p", centers, normals)
+    distances = vertices @ normals.T
+    distances -= offsets
+    return distances
+
+
+def slice_by_planes(vertices, centers, normals):
+    """Split points by planes, see `plane_distances`.
+
+    Returns:
+        (N, P) boolean array, True for the points on the side of the normal of
+        each plane (or on the plane).
+    """
+    return plane_distances(vertices, centers, normals) >= 0
+
+
 def slice_by_plane(mesh, center, n):
-    c = np.dot(center, n)
-    plane_side = lambda x: np.dot(x, n) >= c
-    split = np.asarray([plane_side(v) for v in mesh.vertices])
-    slice1_indices = np.argwhere(split == True)
-    slice2_indices = np.argwhere(split == False)
+    split = slice_by_planes(mesh.vertices, [center], [n])[:, 0]
+    slice1_indices = np.argwhere(split)
+    slice2_indices = np.argwhere(~split)
     return slice1_indices, slice2_indices
 
 
-def remove_points(mesh, indices, blackoutTexture=True):
+def _remap_indices(index_faces, kept):
+    """Remap indices to their position among the kept items.
+
+    Args:
+        index_faces: Array of indices of kept items only.
+        kept: Boolean mask of the kept items.
+
+    Returns:
+        The remapped `index_faces`.
+    """
+    idx_map = np.cumsum(kept, dtype=int)
+    idx_map -= 1
+    return idx_map[index_faces]
+
+
+def _compact_indices(index_faces, n_items):
+    """Drop the items not referenced by faces and remap the faces.
+
+    Args:
+        index_faces: (M, 3) array of indices into a list of `n_items` items.
+        n_items: Number of items.
+
+    Returns:
+        index_faces: The remapped `index_faces`.
+        kept: Boolean mask of the referenced items.
+    """
+    kept = np.zeros(n_items, dtype=bool)
+    kept[index_faces.ravel()] = True
+    return _remap_indices(index_faces, kept), kept
+
+
+def remove_points(mesh, indices, blackoutTexture=True, render_backend="gl",
+                  incremental_blackout=False, texture_out=None):
+    """Remove points of a mesh, and the faces around them.
+
+    If the connectivity of the mesh is already indexed (see
+    `data.Mesh.topology`, e.g. with the "geodesic" metric of `shoot_holes`),
+    only the faces around the removed points are visited. The index is not
+    built otherwise: building it costs more than it saves for a few shapes.
+
+    Args:
+        texture_out: (optional) Array where to write the texture of the
+            result with `incremental_blackout`, see
+            `blackout_texture_incremental`.
+    """
+    with profiling.span("remove_points",
+                        vertices=len(mesh.vertices),
+                        removed=len(indices)):
+        return _remove_points(mesh, indices, blackoutTexture, render_backend,
+                              incremental_blackout, texture_out)
+
+
+def _remove_points(mesh, indices, blackoutTexture, render_backend,
+                   incremental_blackout, texture_out):
     submesh = data.Mesh()
 
     roi_vertices = np.ones(len(mesh.vertices), dtype=bool)
@@ -33,67 +136,286 @@ def remove_points(mesh, indices, blackoutTexture=True):
         submesh.vertex_normals = mesh.vertex_normals[roi_vertices]
 
     if mesh.faces is not None:
-        removed_faces = np.any(np.isin(mesh.faces, indices), axis=1)
-        roi_faces = ~removed_faces
-        faces_subset = mesh.faces[roi_faces]
-
-        idx_map = -np.ones(len(mesh.vertices), dtype=int)
-        idx_map[roi_vertices] = np.arange(sum(roi_vertices))
-        faces_subset = idx_map[faces_subset]
-        submesh.faces = faces_subset
+        # Faces kept if all their vertices are kept. The same mask selects
+        # the geometry, texture and normal indices of the faces.
+        if mesh.has_topology():
+            # Only visit the faces around the removed vertices.
+            removed_faces = mesh.topology.faces_mask(indices)
+            roi_faces = ~removed_faces
+        else:
+            roi_faces = roi_vertices[mesh.faces].all(axis=1)
+            removed_faces = ~roi_faces
+
+        submesh.faces = _remap_indices(mesh.faces[roi_faces], roi_vertices)
 
         if mesh.texture_indices is not None:
-            texture_faces_subset = mesh.texture_indices[roi_faces]
-
-            roi_texcoords = np.zeros(len(mesh.texcoords), dtype=bool)
-            kept_texcoords_indices = np.unique(texture_faces_subset)
-            roi_texcoords[kept_texcoords_indices] = True
-
-            idx_map = -np.ones(len(mesh.texcoords), dtype=int)
-            idx_map[roi_texcoords] = np.arange(sum(roi_texcoords))
-            texture_faces_subset = idx_map[texture_faces_subset]
-
+            texture_faces_subset, roi_texcoords = _compact_indices(
+                mesh.texture_indices[roi_faces], len(mesh.texcoords))
             submesh.texture_indices = texture_faces_subset
             submesh.texcoords = mesh.texcoords[roi_texcoords]
 
-            if blackoutTexture:
-                tri_indices = submesh.texture_indices
-                tex_coords = submesh.texcoords
-                img = render_texture(mesh.texture, tex_coords, tri_indices)
-                # dilate the result to remove sewing
-                kernel = np.ones((3, 3), np.uint8)
-                texture_f32 = cv2.dilate(img, kernel, iterations=1)
-                submesh.texture = texture_f32.astype(np.float64)
+            if blackoutTexture and incremental_blackout:
+                submesh.texture = blackout_texture_incremental(
+                    mesh.texture, mesh.texcoords, mesh.texture_indices,
+                    removed_faces, out=texture_out)
+            elif blackoutTexture:
+                submesh.texture = blackout_texture(
+                    mesh.texture, submesh.texcoords, submesh.texture_indices,
+                    backend=render_backend)
 
         if (mesh.faces_normal_indices is not None
                 and mesh.face_normals is not None):
-            normals_faces_subset = mesh.faces_normal_indices[roi_faces]
-
-            roi_normals = np.zeros(len(mesh.face_normals), dtype=bool)
-            kept_normals_indices = np.unique(normals_faces_subset)
-            roi_normals[kept_normals_indices] = True
-
-            idx_map = -np.ones(len(mesh.face_normals), dtype=int)
-            idx_map[roi_normals] = np.arange(sum(roi_normals))
-            normals_faces_subset = idx_map[normals_faces_subset]
-
+            normals_faces_subset, roi_normals = _compact_indices(
+                mesh.faces_normal_indices[roi_faces], len(mesh.face_normals))
             submesh.faces_normal_indices = normals_faces_subset
             submesh.face_normals = mesh.face_normals[roi_normals]
 
     return submesh
 
 
-def render_texture(texture, tex_coords, tri_indices):
+# Renderers of the process, by output size, kept alive across calls.
+_renderers = {}
+
+
+def _get_renderer(output_size):
+    """Get the renderer of the process for an output size.
+
+    The renderer (i.e. OpenGL context, shaders and framebuffer) is created on
+    first use and reused by the subsequent calls.
+    """
+    renderer = _renderers.get(output_size)
+    if renderer is None:
+        renderer = UVTrianglesRenderer.with_standalone_ctx(output_size)
+        _renderers[output_size] = renderer
+    return renderer
+
+
+def release_renderers():
+    """Release the renderers of the process (see `render_texture`)."""
+    _renderers.clear()
+
+
+atexit.register(release_renderers)
+
+
+def _as_rgb(texture):
     if len(texture.shape) == 3 and texture.shape[2] == 4:
         texture = texture[:, :, 0:3]
     elif len(texture.shape) == 2:
-        texture = np.concatenate([texture, texture, texture], axis=2)
+        texture = np.stack([texture, texture, texture], axis=2)
+    return texture
+
+
+def render_texture(texture, tex_coords, tri_indices, backend="gl"):
+    """Render the texture-space triangles with a texture.
+
+    With the "gl" backend, the renderer is kept alive across calls. The
+    texture uploaded by the previous call with the same output size is reused
+    when `texture` is the same object, e.g. when generating several partial
+    shapes from the same mesh. The texture is thus expected not to be modified
+    in place between calls.
+
+    With the "cpu" backend, the triangles are rasterized in software (see
+    `UVTrianglesRasterizer`), without requiring an OpenGL context.
+    """
+    if backend not in RENDER_BACKENDS:
+        raise ValueError(f"unknown render backend {backend}")
+
+    output_size = (texture.shape[1], texture.shape[0])
+    with profiling.span(f"render_texture_{backend}",
+                        texels=output_size[0] * output_size[1],
+                        triangles=len(tri_indices)):
+        return _render_texture(texture, tex_coords, tri_indices, backend,
+                               output_size)
+
+
+def _render_texture(texture, tex_coords, tri_indices, backend, output_size):
+    if backend == "cpu":
+        renderer = UVTrianglesRasterizer(output_size)
+        return renderer.render(tex_coords, tri_indices, _as_rgb(texture))
+
+    renderer = _get_renderer(output_size)
+
+    if not renderer.has_texture(texture):
+        # The renderer expects float textures.
+        source = texture
+        texture = _as_rgb(data.texture_as_float(texture))
+        renderer.set_texture(texture, flip_y=True, source=source)
+
+    # The renderer expects float coordinates and int indices.
+    tex_coords = tex_coords.astype(float, copy=False)
+    tri_indices = tri_indices.astype(int, copy=False)
+
+    return renderer.render(tex_coords, tri_indices)
+
+
+def _dilate(image):
+    # dilate the result to remove sewing
+    kernel = np.ones((3, 3), np.uint8)
+    return cv2.dilate(image, kernel, iterations=1)
+
+
+def blackout_texture(texture, tex_coords, tri_indices, backend="gl"):
+    """Keep only the texture covered by texture-space triangles.
+
+    The rest of the texture is black. The covered texture is dilated to avoid
+    seams.
+
+    Returns:
+        The float64 texture with values into [0, 1].
+    """
+    img = render_texture(texture, tex_coords, tri_indices, backend=backend)
+    return _dilate(img).astype(np.float64)
+
+
+# Blackout and coverage of the texture by all the faces of the last mesh, for
+# the incremental blackouts.
+_full_blackout_cache = {}
+
+
+def _get_full_blackout(texture, tex_coords, tri_indices):
+    """Get the blackout and coverage of a texture by all the triangles.
+
+    The result is kept for the subsequent calls with the same arrays (i.e. the
+    same objects), e.g. when generating several partial shapes from the same
+    mesh.
+    """
+    sources = (texture, tex_coords, tri_indices)
+    cached_sources = _full_blackout_cache.get("sources", ())
+    if (len(cached_sources) == len(sources)
+            and all(a is b for a, b in zip(cached_sources, sources))):
+        return _full_blackout_cache["blackout"], \
+            _full_blackout_cache["coverage"]
+
+    output_size = (texture.shape[1], texture.shape[0])
+    coverage = rasterizer.uv_triangles_coverage(tex_coords, tri_indices,
+                                                output_size)
+    img = rasterizer.as_float32(_as_rgb(texture))
+    img *= (coverage > 0)[..., np.newaxis]
+    blackout = _dilate(img).astype(np.float64)
+
+    _full_blackout_cache.clear()
+    _full_blackout_cache.update(sources=sources,
+                                blackout=blackout,
+                                coverage=coverage,
+                                # Mask of the lost texels, cleared after use.
+                                is_lost=np.zeros(coverage.shape, dtype=bool))
+    return blackout, coverage
+
+
+# Size of the tiles of texture updated by the incremental blackout.
+BLACKOUT_TILE_SIZE = 64
+
+
+def blackout_texture_incremental(texture, tex_coords, tri_indices, removed,
+                                 out=None):
+    """Blackout the texture of removed triangles.
+
+    Same result as `blackout_texture` with the "cpu" backend on the kept
+    triangles, `tri_indices[~removed]`, but computed from the blackout of the
+    texture by all the triangles (cached across calls, see
+    `_get_full_blackout`). Only the tiles of texture covered by the removed
+    triangles, and their neighbours, are updated, so that the cost scales with
+    the area of the removed triangles rather than with the size of the
+    texture.
 
-    renderer = UVTrianglesRenderer.with_standalone_ctx(
-        (texture.shape[1], texture.shape[0])
-    )
+    Args:
+        texture: The source texture.
+        tex_coords: (N, 2) array of texture coordinates.
+        tri_indices: (M, 3) array of indices into `tex_coords` for all the
+            triangles.
+        removed: Boolean mask of the removed triangles.
+        out: (optional) float64 (H, W, 3) array where to write the result,
+            e.g. the result of the previous call, reused across the partial
+            shapes of a mesh. If it is the `out` of the previous call with the
+            same triangles, and was not modified since, only the tiles written
+            by both calls are updated. Otherwise, the whole texture is. By
+            default, a new array is allocated.
 
-    return renderer.render(tex_coords, tri_indices, texture, True)
+    Returns:
+        The float64 texture with values into [0, 1], `out` if set.
+    """
+    height, width = texture.shape[:2]
+    blackout, coverage = _get_full_blackout(texture, tex_coords, tri_indices)
+    cache = _full_blackout_cache
+    is_reused = out is not None
+    if out is None:
+        out = blackout.copy()
+    elif cache.get("out") is out:
+        # Restore the tiles written by the previous call.
+        _copy_tiles(blackout, cache.pop("out_tiles"), out)
+    else:
+        out[...] = blackout
+    cache.pop("out", None)
+
+    # Texels covered only by removed triangles, counted over the texels of
+    # the removed triangles only.
+    pixels = rasterizer.uv_triangles_pixels(tex_coords, tri_indices[removed],
+                                            (width, height))
+    pixels, removed_coverage = np.unique(pixels, return_counts=True)
+    lost = pixels[coverage.ravel()[pixels] == removed_coverage]
+
+    # Tiles with lost texels, and their neighbours for the dilation.
+    tile_size = BLACKOUT_TILE_SIZE
+    n_tile_rows = -(-height // tile_size)
+    n_tile_cols = -(-width // tile_size)
+    dirty_tiles = np.zeros((n_tile_rows, n_tile_cols), dtype=np.uint8)
+    dirty_tiles[lost // width // tile_size, lost % width // tile_size] = 1
+    dirty_tiles = _dilate(dirty_tiles)
+    tiles = np.nonzero(dirty_tiles)
+
+    if len(lost) > 0:
+        texture = _as_rgb(texture)
+        is_lost = cache["is_lost"]
+        is_lost.ravel()[lost] = True
+        try:
+            with profiling.span("render_texture_incremental",
+                                texels=height * width,
+                                tiles=len(tiles[0])):
+                _blackout_tiles(texture, coverage, is_lost, tiles, out)
+        finally:
+            is_lost.ravel()[lost] = False
+
+    if is_reused:
+        cache.update(out=out, out_tiles=tiles)
+    return out
+
+
+def _tile_bounds(tile_row, tile_col, height, width):
+    """(top, bottom, left, right) bounds of a tile of texture."""
+    top = tile_row * BLACKOUT_TILE_SIZE
+    left = tile_col * BLACKOUT_TILE_SIZE
+    return (top, min(top + BLACKOUT_TILE_SIZE, height),
+            left, min(left + BLACKOUT_TILE_SIZE, width))
+
+
+def _copy_tiles(source, tiles, destination):
+    """Copy tiles of texture, as (tile rows, tile columns) indices."""
+    height, width = source.shape[:2]
+    for tile_row, tile_col in zip(*tiles):
+        top, bottom, left, right = _tile_bounds(tile_row, tile_col, height,
+                                                width)
+        destination[top:bottom, left:right] = source[top:bottom, left:right]
+
+
+def _blackout_tiles(texture, coverage, is_lost, tiles, result):
+    """Update the blackout of the tiles of `blackout_texture_incremental`."""
+    height, width = texture.shape[:2]
+    for tile_row, tile_col in zip(*tiles):
+        top, bottom, left, right = _tile_bounds(tile_row, tile_col, height,
+                                                width)
+        # Window of the tile with a margin of one texel for the dilation.
+        window = (slice(max(top - 1, 0), min(bottom + 1, height)),
+                  slice(max(left - 1, 0), min(right + 1, width)))
+        kept = (coverage[window] > 0) & ~is_lost[window]
+        img = rasterizer.as_float32(texture[window])
+        img *= kept[..., np.newaxis]
+        dilated = _dilate(img)
+        row_offset = top - window[0].start
+        col_offset = left - window[1].start
+        result[top:bottom, left:right] = dilated[
+            row_offset:row_offset + bottom - top,
+            col_offset:col_offset + right - left]
 
 
 def estimate_plane(a, b, c):
@@ -105,16 +427,218 @@ def estimate_plane(a, b, c):
     """
     center = (a + b + c) / 3
     normal = np.cross(b - a, c - a)
-    assert(np.isclose(np.dot(b - a, normal), np.dot(c - a, normal)))
+    # Both null, up to rounding errors relative to the size of the triangle.
+    scale = max(np.linalg.norm(b - a), np.linalg.norm(c - a), 1)
+    assert(np.isclose(np.dot(b - a, normal), np.dot(c - a, normal),
+                      atol=1e-8 * scale ** 3))
     return center, normal
 
 
+# Leaf size of the KD-trees over the vertices.
+KDTREE_LEAFSIZE = 200
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode="wb"):
+    """Write a file through a temporary file renamed to `path`.
+
+    Concurrent processes never read a partial file, and a failed or
+    interrupted write leaves neither a truncated file at `path` nor the
+    temporary file. The parent directories of `path` are created.
+
+    Args:
+        path: Path to the file.
+        mode: Mode in which the temporary file is opened, or None to yield its
+            path instead, for writers that take a path.
+
+    Yields:
+        The temporary file, or its path. It has the extension of `path`.
+    """
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Keep the extension, which may select the format.
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent,
+                                    prefix=f".{path.stem}-",
+                                    suffix=path.suffix)
+    try:
+        if mode is None:
+            os.close(fd)
+            yield tmp_path
+        else:
+            with os.fdopen(fd, mode) as f:
+                yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _hash_array(array):
+    """Hash of the content, type and shape of an array."""
+    array = np.ascontiguousarray(array)
+    hash_ = hashlib.blake2b(digest_size=16)
+    hash_.update(f"{array.dtype.str}{array.shape}".encode())
+    hash_.update(array.data)
+    return hash_.hexdigest()
+
+
+def build_kdtree(vertices, cache_dir=None):
+    """Build the KD-tree over the vertices of a mesh.
+
+    Args:
+        vertices: The array of vertices of the mesh.
+        cache_dir: (optional) Directory where to cache the KD-trees on disk,
+            keyed by the hash of the vertices. If set, the tree is loaded from
+            the cache when it exists, and saved to it otherwise.
+
+    Returns:
+        The KD-tree.
+    """
+    if cache_dir is None:
+        with profiling.span("build_kdtree", vertices=len(vertices)):
+            return KDTree(vertices, leafsize=KDTREE_LEAFSIZE)
+
+    cache_dir = pathlib.Path(cache_dir)
+    key = _hash_array(vertices)
+    cache_path = cache_dir / f"{key}-{KDTREE_LEAFSIZE}.kdtree.pkl"
+    if cache_path.exists():
+        with profiling.span("load_kdtree", vertices=len(vertices)):
+            with open(cache_path, "rb") as f:
+                return pickle.load(f)
+
+    with profiling.span("build_kdtree", vertices=len(vertices)):
+        kdtree = KDTree(vertices, leafsize=KDTREE_LEAFSIZE)
+
+    with atomic_write(cache_path) as f:
+        pickle.dump(kdtree, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return kdtree
+
+
+def edge_graph(vertices, index):
+    """Build the graph of the edges of a mesh.
+
+    Args:
+        vertices: (N, 3) array of vertices.
+        index: The connectivity of the mesh, a `topology.Topology` (e.g.
+            `mesh.topology`).
+
+    Returns:
+        A symmetric (N, N) `scipy.sparse.csr_matrix` of the lengths of the
+        edges, sharing the neighbours arrays of `index`.
+    """
+    n_vertices = len(vertices)
+    indptr = index.neighbours_indptr
+    neighbours = index.neighbours
+    rows = np.repeat(np.arange(n_vertices), np.diff(indptr))
+    lengths = np.linalg.norm(vertices[neighbours] - vertices[rows], axis=1)
+    return scipy.sparse.csr_matrix((lengths, neighbours, indptr),
+                                   shape=(n_vertices, n_vertices))
+
+
+def _csr_ranges(indptr, rows):
+    """Positions of the values of rows of a CSR array, and their counts."""
+    starts = indptr[rows]
+    counts = indptr[rows + 1] - starts
+    offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return np.arange(counts.sum()) + offsets, counts
+
+
+def _local_indices(items, values, n_items):
+    """Positions of values among items, -1 for the values not in items.
+
+    Args:
+        items: Array of distinct indices in [0, n_items).
+        values: Array of indices in [0, n_items).
+    """
+    # Only the entries of `items` are set, the others are checked.
+    lookup = np.empty(n_items, dtype=np.int32)
+    lookup[items] = np.arange(len(items), dtype=np.int32)
+    positions = lookup[values]
+    is_item = (positions >= 0) & (positions < len(items))
+    is_item[is_item] = items[positions[is_item]] == values[is_item]
+    return np.where(is_item, positions, -1)
+
+
+def geodesic_neighbours(graph, kdtree, source, k):
+    """Find the vertices the nearest to a vertex along the edges of a mesh.
+
+    The paths shorter than a radius lie in the Euclidean ball of this radius.
+    The distances along the edges are thus computed with
+    `scipy.sparse.csgraph.dijkstra` on the subgraph of the vertices in a ball,
+    found with the KD-tree. The radius starts from the distance in space to the
+    `k`-th nearest vertex, and is enlarged until `k` vertices are reached
+    along the edges. The cost is proportional to the number of vertices in the
+    ball, i.e. about `k`, rather than to the size of the mesh.
+
+    Args:
+        graph: The graph of the edges, see `edge_graph`.
+        kdtree: The KD-tree of the vertices, see `build_kdtree`.
+        source: Index of the source vertex.
+        k: Number of vertices.
+
+    Returns:
+        Array of the indices of the `k` nearest vertices (including the
+        source), by increasing distance. Fewer if the connected component of
+        the source is smaller.
+    """
+    n_vertices = graph.shape[0]
+    center = kdtree.data[source]
+    k = min(k, n_vertices)
+    # The distances along the edges are at least the ones in space. Start
+    # slightly above, as the paths along the edges are longer.
+    distances, _ = kdtree.query(center, k=[k])
+    radius = max(distances[0] * 1.1, np.finfo(float).tiny)
+    while True:
+        ball = np.asarray(kdtree.query_ball_point(center, radius,
+                                                  return_sorted=False),
+                          dtype=int)
+        positions, counts = _csr_ranges(graph.indptr, ball)
+        columns = _local_indices(ball, graph.indices[positions], n_vertices)
+        kept = columns >= 0
+        rows = np.repeat(np.arange(len(ball)), counts)
+        indptr = np.zeros(len(ball) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows[kept], minlength=len(ball)),
+                  out=indptr[1:])
+        subgraph = scipy.sparse.csr_matrix(
+            (graph.data[positions[kept]], columns[kept], indptr),
+            shape=(len(ball), len(ball)))
+        source_position = np.flatnonzero(ball == source)[0]
+        distances = scipy.sparse.csgraph.dijkstra(
+            subgraph, indices=source_position, limit=radius, min_only=True)
+        # The distances up to the radius are the ones in the whole graph.
+        reached = np.flatnonzero(distances <= radius)
+        if len(reached) >= k:
+            break
+        # Whether the connected component of the source is exhausted, i.e.
+        # all the neighbours of the reached vertices are reached.
+        neighbours = graph.indices[_csr_ranges(graph.indptr,
+                                               ball[reached])[0]]
+        if np.all(_local_indices(ball[reached], neighbours, n_vertices) >= 0):
+            break
+        # The number of vertices grows with the area of the disk.
+        radius *= max(np.sqrt(k / len(reached)), 1.25)
+    # Ties broken by index, as the vertices are visited by a Dijkstra search.
+    order = np.lexsort((ball[reached], distances[reached]))
+    return ball[reached[order[:k]]]
+
+
+def valid_vertex_indices(faces, mask_faces):
+    """Indices of the vertices of the non-masked faces, sorted."""
+    # Counting the occurrences avoids sorting the corners of the faces.
+    return np.flatnonzero(np.bincount(faces[mask_faces > 0].ravel()))
+
+
 def shoot_holes(vertices, n_holes, dropout, mask_faces=None, faces=None,
-                rng=None):
+                rng=None, workers=-1, kdtree=None, valid_indices=None,
+                metric="euclidean", graph=None):
     """Generate a partial shape by cutting holes of random location and size.
 
     Each hole is created by selecting a random point as the center and removing
-    the k nearest-neighboring points around it.
+    the k nearest-neighboring points around it. The nearest points are the
+    nearest in space with the "euclidean" `metric`, or along the edges of the
+    mesh with the "geodesic" `metric` (see `geodesic_neighbours`), so that the
+    holes do not spread to other nearby parts of the surface.
 
     Args:
         vertices: The array of vertices of the mesh.
@@ -128,13 +652,29 @@ def shoot_holes(vertices, n_holes, dropout, mask_faces=None, faces=None,
                     set, the centers of the holes are sampled only on the
                     non-masked regions.
         faces: The array of faces of the mesh. Required only when `mask_faces`
-               is set.
+               is set, or with the "geodesic" `metric` without `graph`.
         rng: (optional) An initialised np.random.Generator object. If None, a
              default Generator is created.
+        workers: Number of threads for the nearest-neighbours queries. -1 to
+                 use all the available processors. Only for the "euclidean"
+                 `metric`.
+        kdtree: (optional) The KD-tree over `vertices` (see `build_kdtree`),
+                to reuse it across calls on the same mesh. If None, it is
+                built. With the "geodesic" `metric`, it bounds the searches
+                along the edges.
+        valid_indices: (optional) The indices of the vertices of the
+                       non-masked faces (see `valid_vertex_indices`), to reuse
+                       them across calls. Replaces `mask_faces` and `faces`.
+        metric: "euclidean" or "geodesic", see above.
+        graph: (optional) The graph of the edges of the mesh (see
+               `edge_graph`), to reuse it across calls with the "geodesic"
+               `metric`. If None, it is built.
 
     Returns:
         array: Indices of the points defining the holes.
     """
+    if metric not in HOLE_METRICS:
+        raise ValueError(f"unknown hole metric {metric}")
     if rng is None:
         rng = np.random.default_rng()
 
@@ -142,9 +682,10 @@ def shoot_holes(vertices, n_holes, dropout, mask_faces=None, faces=None,
         n_holes_min, n_holes_max = n_holes
         n_holes = rng.integers(n_holes_min, n_holes_max)
 
-    if mask_faces is not None:
-        valid_vertex_indices = np.unique(faces[mask_faces > 0])
-        valid_vertices = vertices[valid_vertex_indices]
+    if valid_indices is None and mask_faces is not None:
+        valid_indices = valid_vertex_indices(faces, mask_faces)
+    if valid_indices is not None:
+        valid_vertices = vertices[valid_indices]
     else:
         valid_vertices = vertices
 
@@ -152,20 +693,157 @@ def shoot_holes(vertices, n_holes, dropout, mask_faces=None, faces=None,
     center_indices = rng.choice(len(valid_vertices), size=n_holes)
     centers = valid_vertices[center_indices]
 
-    n_vertices = len(valid_vertices)
+    # Number of neighbours per hole.
+    hole_sizes = _draw_sizes(len(valid_vertices), len(vertices), dropout,
+                             n_holes, rng)
+
+    max_size = hole_sizes.max(initial=0)
+    if max_size == 0:
+        return np.empty(0, dtype=int)
+
+    if metric == "geodesic":
+        if graph is None:
+            graph = edge_graph(vertices,
+                               topology.Topology(faces, len(vertices)))
+        if kdtree is None:
+            kdtree = build_kdtree(vertices)
+        if valid_indices is not None:
+            center_indices = valid_indices[center_indices]
+        to_crop = np.zeros(len(vertices), dtype=bool)
+        with profiling.span("geodesic_queries",
+                            holes=n_holes,
+                            neighbours=hole_sizes.sum()):
+            for center_index, hole_size in zip(center_indices, hole_sizes):
+                to_crop[geodesic_neighbours(graph, kdtree, center_index,
+                                            hole_size)] = True
+        return np.flatnonzero(to_crop)
+
+    # Identify the points indices making up the holes, with a single query for
+    # all the holes.
+    if kdtree is None:
+        kdtree = build_kdtree(vertices)
+    with profiling.span("neighbour_queries",
+                        holes=n_holes,
+                        neighbours=n_holes * max_size):
+        _, indices = kdtree.query(centers, k=max_size, workers=workers)
+    indices = indices.reshape(n_holes, max_size)
+    in_hole = np.arange(max_size) < hole_sizes[:, np.newaxis]
+    to_crop = np.zeros(len(vertices), dtype=bool)
+    to_crop[indices[in_hole]] = True
+
+    return np.flatnonzero(to_crop)
+
+
+def _draw_sizes(n_valid, n_vertices, dropout, n_cuts, rng):
+    """Draw the numbers of points of holes or slices.
+
+    Args:
+        n_valid: Number of points where the cuts can be placed.
+        n_vertices: Total number of points.
+        dropout (float or (float, float)): Proportion of `n_valid` points in
+            each cut, or bounds from which to draw it, see `shoot_holes`.
+        n_cuts: Number of cuts.
+        rng: np.random.Generator.
+
+    Returns:
+        Integer array of the sizes, at most `n_vertices`.
+    """
     if isinstance(dropout, numbers.Number):
-        hole_size = n_vertices * dropout
-        hole_sizes = [hole_size] * n_holes
+        sizes = [n_valid * dropout] * n_cuts
+    else:
+        size_bounds = n_valid * np.asarray(dropout)
+        sizes = rng.integers(*size_bounds, size=n_cuts)
+    # A fractional size is rounded up, as by the KD-tree query.
+    sizes = np.ceil(sizes).astype(int)
+    return np.minimum(sizes, n_vertices)
+
+
+# Maximum number of draws of three points to find a plane through them.
+MAX_PLANE_DRAWS = 100
+
+
+def random_plane(points, rng):
+    """Draw a plane through three random points, see `estimate_plane`.
+
+    The points are drawn again when they are aligned.
+
+    Returns:
+        center(float): The center point of the three drawn points.
+        normal(float): The unit normal to the plane.
+    """
+    for _ in range(MAX_PLANE_DRAWS):
+        a, b, c = points[rng.choice(len(points), size=3)]
+        center, normal = estimate_plane(a, b, c)
+        norm = np.linalg.norm(normal)
+        if norm > 0:
+            return center, normal / norm
+    raise ValueError("could not find three points that are not aligned")
+
+
+def shoot_slices(vertices, n_slices, dropout, mask_faces=None, faces=None,
+                 rng=None, valid_indices=None):
+    """Generate a partial shape by slicing off parts of random orientation and
+    size.
+
+    The orientation of each slice is given by a plane through three random
+    points (see `random_plane`). The plane is moved along its normal so that
+    the slice, on the side of the normal, holds the requested number of
+    points. The distances of the points to all the planes are computed at
+    once (see `plane_distances`).
+
+    Args:
+        vertices: The array of vertices of the mesh.
+        n_slices (int or (int, int)): Number of slices to cut, or bounds from
+            which to randomly draw the number of slices.
+        dropout (float or (float, float)): Proportion of points (with respect
+            to the total number of points) in each slice, or bounds from which
+            to randomly draw the proportions (a different proportion is drawn
+            for each slice).
+        mask_faces: A boolean mask on the faces. 1 to keep, 0 to ignore. If
+                    set, the planes are drawn through points of the non-masked
+                    regions.
+        faces: The array of faces of the mesh. Required only when `mask_faces`
+               is set.
+        rng: (optional) An initialised np.random.Generator object. If None, a
+             default Generator is created.
+        valid_indices: (optional) The indices of the vertices of the
+                       non-masked faces (see `valid_vertex_indices`), to reuse
+                       them across calls. Replaces `mask_faces` and `faces`.
+
+    Returns:
+        array: Indices of the points defining the slices.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    if not isinstance(n_slices, numbers.Integral):
+        n_slices_min, n_slices_max = n_slices
+        n_slices = rng.integers(n_slices_min, n_slices_max)
+
+    if valid_indices is None and mask_faces is not None:
+        valid_indices = valid_vertex_indices(faces, mask_faces)
+    if valid_indices is not None:
+        valid_vertices = vertices[valid_indices]
     else:
-        hole_size_bounds = n_vertices * np.asarray(dropout)
-        hole_sizes = rng.integers(*hole_size_bounds, size=n_holes)
-
-    # Identify the points indices making up the holes.
-    kdtree = KDTree(vertices, leafsize=200)
-    to_crop = []
-    for center, size in zip(centers, hole_sizes):
-        _, indices = kdtree.query(center, k=size)
-        to_crop.append(indices)
-    to_crop = np.unique(np.concatenate(to_crop))
-
-    return to_crop
+        valid_vertices = vertices
+
+    centers = np.empty((n_slices, 3))
+    normals = np.empty((n_slices, 3))
+    for i in range(n_slices):
+        centers[i], normals[i] = random_plane(valid_vertices, rng)
+    slice_sizes = _draw_sizes(len(valid_vertices), len(vertices), dropout,
+                              n_slices, rng)
+
+    with profiling.span("plane_distances",
+                        vertices=len(vertices),
+                        planes=n_slices):
+        distances = plane_distances(vertices, centers, normals)
+    to_crop = np.zeros(len(vertices), dtype=bool)
+    for plane_distance, size in zip(distances.T, slice_sizes):
+        if size == 0:
+            continue
+        # The `size` points the farthest on the side of the normal.
+        first = len(vertices) - size
+        to_crop[np.argpartition(plane_distance, first)[first:]] = True
+
+    return np.flatnonzero(to_crop)